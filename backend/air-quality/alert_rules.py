@@ -0,0 +1,304 @@
+"""
+Server-side pollen and particulate alerts (pollen_alert_rules table): rules are grouped by forecast
+grid cell, each cell's forecast is fetched once and all of its rules are checked in one vectorized
+comparison (NumPy when installed), so the cost grows with distinct locations rather than subscribers.
+Matches are sent through the notifications function, one message per recipient. Rules are written
+by the browser as a whole set per subscription (a random id kept in the browser) with save_rules.
+"""
+
+import bisect
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import psycopg2
+
+import http_client
+import shared_cache
+from hourly_format import HOURLY_SERIES
+from pollen import PARTICULATE_THRESHOLDS, RISK_LEVELS, series_risk, series_thresholds
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SERIES_INDEX = {key: n for n, (key, _) in enumerate(HOURLY_SERIES)}
+SERIES_LABELS = {
+    'alder': 'Ольха',
+    'birch': 'Берёза',
+    'grass': 'Злаки',
+    'mugwort': 'Полынь',
+    'olive': 'Олива',
+    'ragweed': 'Амброзия',
+    'pm25': 'PM2.5',
+    'pm10': 'PM10'
+}
+
+ALERT_WINDOW_HOURS = int(os.environ.get('ALERT_WINDOW_HOURS', '12'))
+ALERT_COOLDOWN_HOURS = int(os.environ.get('ALERT_COOLDOWN_HOURS', '12'))
+NOTIFICATIONS_URL = os.environ.get('NOTIFICATIONS_URL', 'https://functions.poehali.dev/69d98fba-a11e-4a25-bab8-02070f305ce1')
+MAX_RULES_PER_SUBSCRIPTION = 32
+SUBSCRIPTION_ID = re.compile(r'^[A-Za-z0-9-]{16,64}$')
+
+_conn = None
+
+
+def _get_connection():
+    global _conn
+    if _conn is None or _conn.closed:
+        _conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _conn.autocommit = True
+    return _conn
+
+
+def _reset_connection() -> None:
+    global _conn
+    try:
+        if _conn is not None:
+            _conn.close()
+    except Exception:
+        pass
+    _conn = None
+
+
+def rule_threshold(allergen: str, threshold: Optional[float], min_risk: Optional[str]) -> Optional[float]:
+    """Explicit threshold, else the lower bound of the series' risk class (pollen or particulate scale)"""
+    if threshold is not None:
+        return float(threshold)
+    return series_thresholds(allergen).get(min_risk or '')
+
+
+def load_rules(cur) -> List[Dict[str, Any]]:
+    """Enabled rules with a contact that are not inside their cooldown"""
+    cur.execute('''
+        SELECT id, location_lat, location_lon, allergen, threshold, min_risk, email, telegram
+        FROM pollen_alert_rules
+        WHERE enabled AND (email IS NOT NULL OR telegram IS NOT NULL)
+          AND (last_notified_at IS NULL OR last_notified_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour')
+    ''', (ALERT_COOLDOWN_HOURS,))
+    rules = []
+    for rule_id, lat, lon, allergen, threshold, min_risk, email, telegram in cur.fetchall():
+        limit = rule_threshold(allergen, threshold, min_risk)
+        if allergen not in SERIES_INDEX or limit is None:
+            continue
+        rules.append({
+            'id': rule_id, 'lat': float(lat), 'lon': float(lon), 'allergen': allergen,
+            'threshold': limit, 'email': email or '', 'telegram': telegram or ''
+        })
+    return rules
+
+
+def parse_subscription(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Validated rule set from a settings save: {'subscription_id', 'lat', 'lon', 'email', 'telegram',
+    'rules': [{'allergen', 'threshold', 'min_risk'}]}; raises ValueError naming the bad field"""
+    subscription_id = body.get('subscription_id')
+    if not isinstance(subscription_id, str) or not SUBSCRIPTION_ID.match(subscription_id):
+        raise ValueError('subscription_id must be 16-64 letters, digits or dashes')
+    rules = body.get('rules')
+    if not isinstance(rules, list) or len(rules) > MAX_RULES_PER_SUBSCRIPTION:
+        raise ValueError(f'rules must be a list of at most {MAX_RULES_PER_SUBSCRIPTION} rules')
+    email = str(body.get('email') or '').strip()
+    telegram = str(body.get('telegram') or '').strip()
+    if rules and not (email or telegram):
+        raise ValueError('email or telegram required')
+    lat = lon = 0.0
+    if rules:
+        try:
+            lat, lon = float(body['lat']), float(body['lon'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('lat and lon required')
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError('lat or lon out of range')
+
+    parsed = []
+    for rule in rules:
+        allergen = rule.get('allergen') if isinstance(rule, dict) else None
+        if allergen not in SERIES_INDEX:
+            raise ValueError(f"allergen must be one of {', '.join(SERIES_INDEX)}")
+        threshold, min_risk = rule.get('threshold'), rule.get('min_risk')
+        if threshold is not None:
+            if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or threshold < 0:
+                raise ValueError('threshold must be a non-negative number')
+            threshold = float(threshold)
+        if min_risk is not None and min_risk not in series_thresholds(allergen):
+            raise ValueError('min_risk must be medium, high or very_high')
+        if threshold is None and min_risk is None:
+            raise ValueError('threshold or min_risk required')
+        parsed.append({'allergen': allergen, 'threshold': threshold, 'min_risk': min_risk})
+    return {
+        'subscription_id': subscription_id, 'lat': lat, 'lon': lon,
+        'email': email or None, 'telegram': telegram or None, 'rules': parsed
+    }
+
+
+def save_rules(subscription: Dict[str, Any]) -> int:
+    """Replace all rules of a subscription in one transaction; a rule that existed before with the same
+    allergen and limits keeps its last_notified_at, so saving the settings again does not restart alerts"""
+    try:
+        with _get_connection().cursor() as cur:
+            cur.execute('BEGIN')
+            cur.execute('''
+                DELETE FROM pollen_alert_rules WHERE subscription_id = %s
+                RETURNING allergen, threshold, min_risk, last_notified_at
+            ''', (subscription['subscription_id'],))
+            notified_at = {(allergen, threshold, min_risk): at for allergen, threshold, min_risk, at in cur.fetchall()}
+            for rule in subscription['rules']:
+                cur.execute('''
+                    INSERT INTO pollen_alert_rules (subscription_id, location_lat, location_lon, allergen,
+                                                    threshold, min_risk, email, telegram, last_notified_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ''', (subscription['subscription_id'], subscription['lat'], subscription['lon'], rule['allergen'],
+                      rule['threshold'], rule['min_risk'], subscription['email'], subscription['telegram'],
+                      notified_at.get((rule['allergen'], rule['threshold'], rule['min_risk']))))
+            cur.execute('COMMIT')
+    except psycopg2.Error:
+        # Closing the connection rolls back an open transaction
+        _reset_connection()
+        raise
+    return len(subscription['rules'])
+
+
+def group_by_cell(rules: List[Dict[str, Any]]) -> Dict[Tuple[float, float], List[Dict[str, Any]]]:
+    """Rules keyed by the same grid cell the API and the shared cache use"""
+    cells: Dict[Tuple[float, float], List[Dict[str, Any]]] = {}
+    for rule in rules:
+        cells.setdefault(shared_cache.snap(rule['lat'], rule['lon']), []).append(rule)
+    return cells
+
+
+def window_start(data: Dict[str, Any]) -> int:
+    """Index of the current local hour in the hourly arrays, which start at local midnight of the first
+    forecast day; the wall clock is used since a cached payload's current block may be hours old"""
+    times = (data.get('hourly') or {}).get('time') or []
+    offset = data.get('utc_offset_seconds')
+    if offset is not None:
+        now = (datetime.now(timezone.utc) + timedelta(seconds=offset)).strftime('%Y-%m-%dT%H')
+    else:
+        now = ((data.get('current') or {}).get('time') or '')[:13]
+    return bisect.bisect_left(times, f'{now}:00') if now else 0
+
+
+def window_peaks(hourly: Dict[str, Any], start: int = 0,
+                 hours: int = ALERT_WINDOW_HOURS) -> Tuple[List[float], List[str]]:
+    """Maximum of every series over the `hours` hours from index `start` and the hour it occurs"""
+    times = (hourly.get('time') or [])[start:start + hours]
+    peaks: List[float] = []
+    peak_times: List[str] = []
+    for _, variable in HOURLY_SERIES:
+        values = (hourly.get(variable) or [])[start:start + hours]
+        best, best_at = 0.0, ''
+        for n, value in enumerate(values):
+            if value is not None and value > best:
+                best, best_at = value, times[n] if n < len(times) else ''
+        peaks.append(best)
+        peak_times.append(best_at)
+    return peaks, peak_times
+
+
+def evaluate_cell(data: Dict[str, Any], rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rules of one cell whose series peaks at or above their threshold within the coming window"""
+    peaks, peak_times = window_peaks(data.get('hourly') or {}, window_start(data))
+    series = [SERIES_INDEX[rule['allergen']] for rule in rules]
+    thresholds = [rule['threshold'] for rule in rules]
+    if np is not None:
+        hits = (np.asarray(peaks)[np.asarray(series, dtype=np.intp)] >= np.asarray(thresholds)).tolist()
+    else:
+        hits = [peaks[index] >= limit for index, limit in zip(series, thresholds)]
+    return [
+        {**rule, 'value': peaks[index], 'at': peak_times[index]}
+        for rule, index, hit in zip(rules, series, hits) if hit
+    ]
+
+
+def compose_message(matches: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """(message, notification type) for all matches of one recipient; each series is classed on its
+    own scale, and the title names pollen, particulates or both"""
+    high = any(series_risk(match['allergen'], match['value']) in ('high', 'very_high') for match in matches)
+    lines = []
+    for match in sorted(matches, key=lambda match: -match['value']):
+        level = RISK_LEVELS[series_risk(match['allergen'], match['value'])]
+        at = f" к {match['at'][11:16]}" if match['at'] else ''
+        line = f"{SERIES_LABELS[match['allergen']]}: {match['value']:.1f} ({level}){at}"
+        # Several rules of one recipient (e.g. two thresholds for one allergen) can match the same peak
+        if line not in lines:
+            lines.append(line)
+    pollen = any(match['allergen'] not in PARTICULATE_THRESHOLDS for match in matches)
+    particulates = any(match['allergen'] in PARTICULATE_THRESHOLDS for match in matches)
+    if pollen and particulates:
+        subject = 'уровень пыльцы и частиц PM'
+    elif particulates:
+        subject = 'уровень частиц PM'
+    else:
+        subject = 'уровень пыльцы'
+    title = f'⚠️ ВЫСОКИЙ {subject}!' if high else f'⚡ Средний {subject}'
+    advice = ('Рекомендуется оставаться в помещении и принять антигистаминные препараты.' if high and pollen
+              else 'Рекомендуется оставаться в помещении и закрыть окна.' if high
+              else 'Будьте внимательны при выходе на улицу.')
+    prefix = 'pollen' if pollen else 'air_quality'
+    return f"{title}\n\n" + '\n'.join(lines) + f"\n\n{advice}", f"{prefix}_high" if high else f"{prefix}_medium"
+
+
+def run(fetch: Callable[[float, float], Dict[str, Any]]) -> Dict[str, Any]:
+    """Evaluate every due rule and notify the matched recipients; `fetch(cell_lat, cell_lon)` returns
+    the Open-Meteo air-quality payload for a cell"""
+    try:
+        with _get_connection().cursor() as cur:
+            rules = load_rules(cur)
+    except psycopg2.Error:
+        _reset_connection()
+        raise
+
+    cells = group_by_cell(rules)
+    matches: List[Dict[str, Any]] = []
+    cell_errors = 0
+    evaluate_seconds = 0.0
+    for (cell_lat, cell_lon), cell_rules in cells.items():
+        try:
+            data = fetch(cell_lat, cell_lon)
+        except Exception as e:
+            print(f"Alert forecast error for cell {cell_lat},{cell_lon}: {e}")
+            cell_errors += 1
+            continue
+        started = time.perf_counter()
+        matches.extend(evaluate_cell(data, cell_rules))
+        evaluate_seconds += time.perf_counter() - started
+
+    recipients: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for match in matches:
+        recipients.setdefault((match['email'], match['telegram']), []).append(match)
+
+    notified: List[int] = []
+    failed = 0
+    for (email, telegram), recipient_matches in recipients.items():
+        message, notification_type = compose_message(recipient_matches)
+        try:
+            http_client.post_json(NOTIFICATIONS_URL, {
+                'email': email, 'telegram': telegram, 'message': message, 'type': notification_type
+            })
+            notified.extend(match['id'] for match in recipient_matches)
+        except Exception as e:
+            print(f"Alert notification error: {e}")
+            failed += 1
+
+    if notified:
+        try:
+            with _get_connection().cursor() as cur:
+                cur.execute('UPDATE pollen_alert_rules SET last_notified_at = CURRENT_TIMESTAMP WHERE id = ANY(%s)',
+                            (notified,))
+        except psycopg2.Error as e:
+            print(f"Alert cooldown update error: {e}")
+            _reset_connection()
+
+    return {
+        'rules': len(rules),
+        'cells': len(cells),
+        'cellErrors': cell_errors,
+        'matches': len(matches),
+        'recipients': len(recipients),
+        'notified': len(recipients) - failed,
+        'failed': failed,
+        'evaluateMs': round(evaluate_seconds * 1000, 2)
+    }
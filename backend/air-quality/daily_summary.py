@@ -0,0 +1,69 @@
+"""
+Per-day max, mean and peak hour of every hourly pollen and particulate series, computed in one pass
+over the hourly columns (rows are grouped by their local date), with the get_pollen_level risk class
+of each day's pollen maximum
+"""
+
+from typing import Any, Dict, List
+
+from hourly_format import HOURLY_SERIES
+from pollen import get_pollen_level
+
+# Particulates have their own scale; the pollen risk classes do not apply to them
+PARTICULATES = {'pm25', 'pm10'}
+
+
+def _reduce(hourly: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """[{'date', 'stats': [[max, sum, count, peak hour] per series]}] in time order"""
+    times = hourly.get('time') or []
+    columns = [hourly.get(variable) or [] for _, variable in HOURLY_SERIES]
+    days: List[Dict[str, Any]] = []
+    for i, time_value in enumerate(times):
+        date = time_value[:10]
+        if not days or days[-1]['date'] != date:
+            days.append({'date': date, 'stats': [[None, 0.0, 0, None] for _ in columns]})
+        hour = int(time_value[11:13])
+        for values, acc in zip(columns, days[-1]['stats']):
+            value = values[i] if i < len(values) else None
+            if value is None:
+                continue
+            acc[1] += value
+            acc[2] += 1
+            if acc[0] is None or value > acc[0]:
+                acc[0] = value
+                acc[3] = hour
+    return days
+
+
+def _summary(key: str, acc: List[Any]) -> Dict[str, Any]:
+    maximum, total, count, peak_hour = acc
+    item = {
+        'max': round(maximum, 1) if maximum is not None else None,
+        'mean': round(total / count, 1) if count else None,
+        'peakHour': peak_hour
+    }
+    if key not in PARTICULATES:
+        item['risk'] = get_pollen_level(maximum)['risk']
+    return item
+
+
+def build_daily(hourly: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One entry per day: {'date', <series>: {'max', 'mean', 'peakHour'[, 'risk']}}"""
+    result = []
+    for day in _reduce(hourly):
+        entry: Dict[str, Any] = {'date': day['date']}
+        for (key, _), acc in zip(HOURLY_SERIES, day['stats']):
+            entry[key] = _summary(key, acc)
+        result.append(entry)
+    return result
+
+
+def build_daily_columns(hourly: Dict[str, Any]) -> Dict[str, Any]:
+    """{'date': [...], <series>: {'max': [...], 'mean': [...], 'peakHour': [...][, 'risk': [...]]}}"""
+    days = _reduce(hourly)
+    result: Dict[str, Any] = {'date': [day['date'] for day in days]}
+    for n, (key, _) in enumerate(HOURLY_SERIES):
+        summaries = [_summary(key, day['stats'][n]) for day in days]
+        result[key] = {field: [summary[field] for summary in summaries] for field in ('max', 'mean', 'peakHour', 'risk')
+                       if key not in PARTICULATES or field != 'risk'}
+    return result
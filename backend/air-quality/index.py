@@ -1,13 +1,47 @@
 """
 Business: Get air quality and pollen forecast data from Open-Meteo
-Args: event with httpMethod, queryStringParameters (lat, lon)
-Returns: HTTP response with air quality index and allergen levels for 7 days
+Args: event with httpMethod, queryStringParameters (lat, lon, hours (1-168, default 48),
+      format=rows|columnar, view=daily for the daily section alone, action=cache-stats|run-alerts);
+      POST ?action=alert-rules with the browser's pollen/PM alert rules, which replace the stored ones
+Returns: HTTP response with air quality index, allergen levels and per-day pollen/PM aggregates for 7 days
 """
 
+import hmac
 import json
-import urllib.request
+import os
 from typing import Dict, Any
 
+import alert_rules
+import daily_summary
+import http_cache
+import http_client
+import hourly_format
+import shared_cache
+from pollen import get_pollen_level
+from single_flight import SingleFlight, normalize_url
+
+upstream_flights = SingleFlight()
+
+SHARED_CACHE_TTL = int(os.environ.get('UPSTREAM_CACHE_TTL', '1800'))
+
+# Open-Meteo air quality current values advance hourly
+UPDATE_PERIOD = 3600
+
+AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality?latitude={lat}&longitude={lon}&current=european_aqi,pm10,pm2_5,carbon_monoxide,nitrogen_dioxide,sulphur_dioxide,ozone,dust,uv_index,ammonia,alder_pollen,birch_pollen,grass_pollen,mugwort_pollen,olive_pollen,ragweed_pollen&hourly=pm10,pm2_5,alder_pollen,birch_pollen,grass_pollen,ragweed_pollen,mugwort_pollen,olive_pollen&timezone=auto&forecast_days=7"
+
+def fetch_air_quality_data(lat: float, lon: float) -> Dict[str, Any]:
+    """Fetch raw air quality forecast from Open-Meteo API, coalescing concurrent identical requests"""
+    url = AIR_QUALITY_URL.format(lat=lat, lon=lon)
+    
+    data, _ = upstream_flights.do(normalize_url(url), lambda: http_client.get_json(url))
+    return data
+
+def fetch_cell(cell_lat: float, cell_lon: float) -> Dict[str, Any]:
+    return shared_cache.fetch_through(
+        'air-quality', cell_lat, cell_lon, '', SHARED_CACHE_TTL,
+        lambda: fetch_air_quality_data(cell_lat, cell_lon)
+    )
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -16,14 +50,55 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Accept-Encoding',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    params = event.get('queryStringParameters') or {}
+    
+    if method == 'POST' and params.get('action') == 'alert-rules':
+        try:
+            body = json.loads(event.get('body') or '{}')
+            if not isinstance(body, dict):
+                raise ValueError('expected a JSON object')
+            subscription = alert_rules.parse_subscription(body)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': f'Invalid alert rules: {e}'}),
+                'isBase64Encoded': False
+            }
+        try:
+            saved = alert_rules.save_rules(subscription)
+        except Exception as e:
+            print(f"Alert rules save error: {e}")
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'rules': saved}),
+            'isBase64Encoded': False
+        }
+    
     if method != 'GET':
         return {
             'statusCode': 405,
@@ -35,15 +110,76 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    params = event.get('queryStringParameters') or {}
+    if params.get('action') == 'cache-stats':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'singleFlight': upstream_flights.stats(), 'httpClient': http_client.stats()}),
+            'isBase64Encoded': False
+        }
+    
+    if params.get('action') == 'run-alerts':
+        # Invoked by the scheduler with X-Alert-Token equal to ALERT_RUN_TOKEN; without a configured token
+        # notification runs are disabled rather than open to anyone
+        token = os.environ.get('ALERT_RUN_TOKEN')
+        if not token or not hmac.compare_digest(http_cache.get_header(event, 'X-Alert-Token') or '', token):
+            return {
+                'statusCode': 403,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Forbidden'}),
+                'isBase64Encoded': False
+            }
+        try:
+            summary = alert_rules.run(fetch_cell)
+        except Exception as e:
+            print(f"Alert run error: {e}")
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps(summary),
+            'isBase64Encoded': False
+        }
+    
     lat = params.get('lat', 55.7558)
     lon = params.get('lon', 37.6173)
     
     try:
-        api_url = f"https://air-quality-api.open-meteo.com/v1/air-quality?latitude={lat}&longitude={lon}&current=european_aqi,pm10,pm2_5,carbon_monoxide,nitrogen_dioxide,sulphur_dioxide,ozone,dust,uv_index,ammonia,alder_pollen,birch_pollen,grass_pollen,mugwort_pollen,olive_pollen,ragweed_pollen&hourly=pm10,pm2_5,alder_pollen,birch_pollen,grass_pollen,ragweed_pollen,mugwort_pollen,olive_pollen&timezone=auto&forecast_days=7"
-        
-        with urllib.request.urlopen(api_url) as response:
-            data = json.loads(response.read().decode())
+        hours = hourly_format.parse_hours(params.get('hours'))
+        output_format = hourly_format.parse_format(params.get('format'))
+        view = params.get('view') or 'full'
+        if view not in ('full', 'daily'):
+            raise ValueError('view must be one of: full, daily')
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        data = fetch_cell(*shared_cache.snap(float(lat), float(lon)))
         
         current = data.get('current', {})
         hourly = data.get('hourly', {})
@@ -65,18 +201,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             aqi_level = 'Удовлетворительное'
             aqi_color = 'yellow'
         
-        def get_pollen_level(value):
-            if value is None or value == 0:
-                return {'level': 'Нет', 'risk': 'low', 'value': 0}
-            elif value < 20:
-                return {'level': 'Низкий', 'risk': 'low', 'value': value}
-            elif value < 50:
-                return {'level': 'Средний', 'risk': 'medium', 'value': value}
-            elif value < 100:
-                return {'level': 'Высокий', 'risk': 'high', 'value': value}
-            else:
-                return {'level': 'Очень высокий', 'risk': 'very_high', 'value': value}
-        
         allergens = {
             'alder': {
                 'name': 'Ольха',
@@ -116,32 +240,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         }
         
-        hourly_forecast = []
-        if hourly.get('time'):
-            time_list = hourly['time'][:48] if len(hourly['time']) > 48 else hourly['time']
-            for i, time in enumerate(time_list):
-                item = {'time': time}
-                
-                alder_list = hourly.get('alder_pollen', [])
-                birch_list = hourly.get('birch_pollen', [])
-                grass_list = hourly.get('grass_pollen', [])
-                mugwort_list = hourly.get('mugwort_pollen', [])
-                olive_list = hourly.get('olive_pollen', [])
-                ragweed_list = hourly.get('ragweed_pollen', [])
-                pm25_list = hourly.get('pm2_5', [])
-                pm10_list = hourly.get('pm10', [])
-                
-                item['alder'] = alder_list[i] if i < len(alder_list) else 0
-                item['birch'] = birch_list[i] if i < len(birch_list) else 0
-                item['grass'] = grass_list[i] if i < len(grass_list) else 0
-                item['mugwort'] = mugwort_list[i] if i < len(mugwort_list) else 0
-                item['olive'] = olive_list[i] if i < len(olive_list) else 0
-                item['ragweed'] = ragweed_list[i] if i < len(ragweed_list) else 0
-                item['pm25'] = pm25_list[i] if i < len(pm25_list) else 0
-                item['pm10'] = pm10_list[i] if i < len(pm10_list) else 0
-                
-                hourly_forecast.append(item)
-        
         result = {
             'aqi': {
                 'value': round(aqi) if aqi else 0,
@@ -159,20 +257,34 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'ammonia': round(current.get('ammonia', 0), 1)
             },
             'allergens': allergens,
-            'hourlyForecast': hourly_forecast,
             'uv_index': current.get('uv_index', 0),
             'dust': current.get('dust', 0)
         }
         
-        return {
-            'statusCode': 200,
-            'headers': {
+        # Columnar: one time array plus one array per series instead of a dict per hour
+        if output_format == 'columnar':
+            daily = daily_summary.build_daily_columns(hourly)
+        else:
+            daily = daily_summary.build_daily(hourly)
+        
+        if view == 'daily':
+            result = {'daily': daily}
+        elif output_format == 'columnar':
+            result['hourly'] = hourly_format.build_columns(hourly, hours)
+            result['daily'] = daily
+        else:
+            result['hourlyForecast'] = hourly_format.build_rows(hourly, hours)
+            result['daily'] = daily
+        
+        return http_cache.conditional_response(
+            event,
+            json.dumps(result, ensure_ascii=False),
+            {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(result, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
+            max_age=http_cache.seconds_until_next(UPDATE_PERIOD)
+        )
         
     except Exception as e:
         return {
@@ -0,0 +1,47 @@
+"""
+Pollen concentration classes (grains/m³) shared by the API response and the alert rules, and the
+particulate classes (µg/m³) the alert rules use for pm25 and pm10
+"""
+
+from typing import Any, Dict
+
+# Lower bound of each risk class; values below MEDIUM are 'low'
+RISK_THRESHOLDS = {
+    'medium': 20,
+    'high': 50,
+    'very_high': 100
+}
+
+# European AQI bands: moderate, poor and very poor
+PARTICULATE_THRESHOLDS = {
+    'pm25': {'medium': 20, 'high': 25, 'very_high': 50},
+    'pm10': {'medium': 40, 'high': 50, 'very_high': 100}
+}
+
+RISK_LEVELS = {'low': 'Низкий', 'medium': 'Средний', 'high': 'Высокий', 'very_high': 'Очень высокий'}
+
+
+def series_thresholds(key: str) -> Dict[str, float]:
+    """Risk class lower bounds for a response series key (alder ... ragweed, pm25, pm10)"""
+    return PARTICULATE_THRESHOLDS.get(key, RISK_THRESHOLDS)
+
+
+def series_risk(key: str, value: Any) -> str:
+    thresholds = series_thresholds(key)
+    for risk in ('very_high', 'high', 'medium'):
+        if value is not None and value >= thresholds[risk]:
+            return risk
+    return 'low'
+
+
+def get_pollen_level(value: Any) -> Dict[str, Any]:
+    if value is None or value == 0:
+        return {'level': 'Нет', 'risk': 'low', 'value': 0}
+    elif value < RISK_THRESHOLDS['medium']:
+        return {'level': 'Низкий', 'risk': 'low', 'value': value}
+    elif value < RISK_THRESHOLDS['high']:
+        return {'level': 'Средний', 'risk': 'medium', 'value': value}
+    elif value < RISK_THRESHOLDS['very_high']:
+        return {'level': 'Высокий', 'risk': 'high', 'value': value}
+    else:
+        return {'level': 'Очень высокий', 'risk': 'very_high', 'value': value}
@@ -0,0 +1,120 @@
+"""
+Bounded LRU cache of search results for search-as-you-type: exact hits, answers for longer queries
+derived by filtering a complete shorter-prefix result set, and short-lived negative entries
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from gazetteer import normalize
+
+MAX_ENTRIES = int(os.environ.get('AUTOCOMPLETE_CACHE_MAX_ENTRIES', '2048'))
+TTL_SECONDS = int(os.environ.get('AUTOCOMPLETE_CACHE_TTL', '3600'))
+NEGATIVE_TTL_SECONDS = int(os.environ.get('AUTOCOMPLETE_CACHE_NEGATIVE_TTL', '600'))
+MIN_PREFIX = 2
+
+
+def _script(text: str) -> str:
+    for ch in text:
+        if 'а' <= ch <= 'я' or ch == 'ё':
+            return 'cyrillic'
+        if 'a' <= ch <= 'z':
+            return 'latin'
+    return 'other'
+
+
+def _matches(name: str, query: str) -> bool:
+    """Prefix match on the whole name or on any later word, as the local indexes do"""
+    words = name.split(' ')
+    return any(' '.join(words[n:]).startswith(query) for n in range(len(words)))
+
+
+class PrefixCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: int = TTL_SECONDS,
+                 negative_ttl: int = NEGATIVE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # normalized query -> (stored_at, results, complete)
+        self._entries: 'OrderedDict[str, Tuple[float, List[Dict[str, Any]], bool]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.prefix_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fresh(self, key: str) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, results, complete = entry
+        if time.time() - stored_at > (self.ttl if results else self.negative_ttl):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return results, complete
+
+    def _filter(self, results: List[Dict[str, Any]], query: str) -> Optional[List[Dict[str, Any]]]:
+        """Results of a shorter prefix that also match the query; None when a result may have matched
+        the upstream through a spelling in another script, which the names here cannot confirm"""
+        kept = []
+        for result in results:
+            name = normalize(result.get('name', ''))
+            if _matches(name, query):
+                kept.append(result)
+            elif _script(name) != _script(query):
+                return None
+        return kept
+
+    def get(self, query: str) -> Tuple[Optional[List[Dict[str, Any]]], str]:
+        """Return (results, state) with state 'HIT', 'PREFIX', 'NEGATIVE' or 'MISS'"""
+        key = normalize(query)
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                if entry[0]:
+                    self.hits += 1
+                    return entry[0], 'HIT'
+                self.negative_hits += 1
+                return [], 'NEGATIVE'
+
+            for length in range(len(key) - 1, MIN_PREFIX - 1, -1):
+                entry = self._fresh(key[:length])
+                if entry is None or not entry[1]:
+                    continue
+                filtered = self._filter(entry[0], key)
+                if filtered is None:
+                    break
+                self.prefix_hits += 1
+                return filtered, 'PREFIX'
+
+            self.misses += 1
+            return None, 'MISS'
+
+    def put(self, query: str, results: List[Dict[str, Any]], complete: bool) -> None:
+        """Store results; `complete` means nothing outside the list matches this query, so longer
+        queries may be answered by filtering it. Empty results are kept for negative_ttl."""
+        key = normalize(query)
+        with self._lock:
+            self._entries[key] = (time.time(), results, complete or not results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.prefix_hits + self.negative_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'maxEntries': self.max_entries,
+            'hits': self.hits,
+            'prefixHits': self.prefix_hits,
+            'negativeHits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hitRate': round((lookups - self.misses) / lookups, 3) if lookups else None
+        }
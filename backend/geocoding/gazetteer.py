@@ -0,0 +1,133 @@
+"""
+In-memory gazetteer of Russian cities with a sorted prefix index: names, alternate names and
+English spellings are normalized and kept in one sorted array searched with bisect
+"""
+
+import bisect
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# (name, lat, lon, admin1, alternate names and English spellings)
+PLACES = [
+    ('Москва', 55.7558, 37.6173, 'Москва', ['Moscow', 'Moskva']),
+    ('Санкт-Петербург', 59.9311, 30.3609, 'Санкт-Петербург', ['Saint Petersburg', 'St Petersburg', 'Sankt-Peterburg', 'Петербург', 'Питер', 'СПб']),
+    ('Новосибирск', 55.0084, 82.9357, 'Новосибирская область', ['Novosibirsk']),
+    ('Екатеринбург', 56.8389, 60.6057, 'Свердловская область', ['Yekaterinburg', 'Ekaterinburg']),
+    ('Казань', 55.7961, 49.1064, 'Татарстан', ['Kazan']),
+    ('Нижний Новгород', 56.3269, 44.0059, 'Нижегородская область', ['Nizhny Novgorod']),
+    ('Челябинск', 55.1644, 61.4368, 'Челябинская область', ['Chelyabinsk']),
+    ('Самара', 53.1959, 50.1002, 'Самарская область', ['Samara']),
+    ('Омск', 54.9885, 73.3242, 'Омская область', ['Omsk']),
+    ('Ростов-на-Дону', 47.2357, 39.7015, 'Ростовская область', ['Rostov-on-Don', 'Ростов']),
+    ('Уфа', 54.7388, 55.9721, 'Башкортостан', ['Ufa']),
+    ('Красноярск', 56.0153, 92.8932, 'Красноярский край', ['Krasnoyarsk']),
+    ('Тольятти', 53.5303, 49.3461, 'Самарская область', ['Tolyatti', 'Togliatti']),
+    ('Саранск', 54.1838, 45.1749, 'Мордовия', ['Saransk']),
+    ('Краснодар', 45.0355, 38.9753, 'Краснодарский край', ['Krasnodar']),
+    ('Воронеж', 51.6605, 39.2005, 'Воронежская область', ['Voronezh']),
+    ('Пермь', 58.0105, 56.2502, 'Пермский край', ['Perm']),
+    ('Волгоград', 48.7080, 44.5133, 'Волгоградская область', ['Volgograd']),
+    ('Тюмень', 57.1522, 65.5272, 'Тюменская область', ['Tyumen']),
+    ('Барнаул', 53.3480, 83.7799, 'Алтайский край', ['Barnaul']),
+    ('Иркутск', 52.2978, 104.2964, 'Иркутская область', ['Irkutsk']),
+    ('Владивосток', 43.1332, 131.9113, 'Приморский край', ['Vladivostok']),
+    ('Ярославль', 57.6261, 39.8845, 'Ярославская область', ['Yaroslavl']),
+    ('Тула', 54.1934, 37.6156, 'Тульская область', ['Tula']),
+    ('Севастополь', 44.6160, 33.5252, 'Севастополь', ['Sevastopol']),
+    ('Махачкала', 42.9849, 47.5047, 'Дагестан', ['Makhachkala']),
+    ('Хабаровск', 48.4827, 135.0838, 'Хабаровский край', ['Khabarovsk']),
+    ('Оренбург', 51.7727, 55.0988, 'Оренбургская область', ['Orenburg']),
+    ('Новокузнецк', 53.7577, 87.1099, 'Кемеровская область', ['Novokuznetsk']),
+    ('Рязань', 54.6269, 39.6916, 'Рязанская область', ['Ryazan']),
+    ('Томск', 56.4977, 84.9744, 'Томская область', ['Tomsk']),
+    ('Кемерово', 55.3547, 86.0861, 'Кемеровская область', ['Kemerovo']),
+    ('Астрахань', 46.3497, 48.0408, 'Астраханская область', ['Astrakhan']),
+    ('Пенза', 53.2001, 45.0000, 'Пензенская область', ['Penza']),
+    ('Липецк', 52.6097, 39.5708, 'Липецкая область', ['Lipetsk']),
+    ('Киров', 58.6035, 49.6679, 'Кировская область', ['Kirov']),
+    ('Чебоксары', 56.1439, 47.2489, 'Чувашия', ['Cheboksary']),
+    ('Калининград', 54.7104, 20.4522, 'Калининградская область', ['Kaliningrad']),
+    ('Брянск', 53.2521, 34.3717, 'Брянская область', ['Bryansk']),
+    ('Иваново', 57.0000, 40.9833, 'Ивановская область', ['Ivanovo']),
+    ('Магнитогорск', 53.4078, 58.9797, 'Челябинская область', ['Magnitogorsk']),
+    ('Курск', 51.7373, 36.1873, 'Курская область', ['Kursk']),
+    ('Тверь', 56.8587, 35.9176, 'Тверская область', ['Tver']),
+    ('Нижний Тагил', 57.9197, 59.9650, 'Свердловская область', ['Nizhny Tagil']),
+    ('Ставрополь', 45.0428, 41.9734, 'Ставропольский край', ['Stavropol']),
+    ('Улан-Удэ', 51.8272, 107.6063, 'Бурятия', ['Ulan-Ude']),
+    ('Сочи', 43.6028, 39.7342, 'Краснодарский край', ['Sochi']),
+    ('Калуга', 54.5293, 36.2754, 'Калужская область', ['Kaluga']),
+    ('Владимир', 56.1294, 40.4063, 'Владимирская область', ['Vladimir']),
+    ('Архангельск', 64.5401, 40.5433, 'Архангельская область', ['Arkhangelsk']),
+    ('Мурманск', 68.9585, 33.0827, 'Мурманская область', ['Murmansk']),
+    ('Якутск', 62.0355, 129.6755, 'Якутия', ['Yakutsk']),
+    ('Смоленск', 54.7824, 32.0454, 'Смоленская область', ['Smolensk']),
+    ('Сургут', 61.2500, 73.4167, 'Ханты-Мансийский АО', ['Surgut'])
+]
+
+
+def normalize(text: str) -> str:
+    """Case-fold, treat ё as е and hyphens/punctuation as spaces, collapse whitespace"""
+    text = text.lower().replace('ё', 'е')
+    text = ''.join(ch if ch.isalnum() else ' ' for ch in text)
+    return ' '.join(text.split())
+
+
+class Gazetteer:
+    """Sorted (key, rank, place id) array; a prefix query is one bisect plus a scan over the matches.
+
+    Every full name is indexed with rank 0 and every later word of a multi-word name with rank 1,
+    so "тагил" finds "Нижний Тагил" without scanning all names.
+    """
+
+    def __init__(self, places: Iterable[Tuple[str, float, float, str, List[str]]]):
+        self.places: List[Dict[str, Any]] = []
+        self._exact: Dict[str, int] = {}
+        entries = []
+        for place_id, (name, lat, lon, admin1, alternates) in enumerate(places):
+            self.places.append({'name': name, 'lat': lat, 'lon': lon, 'admin1': admin1})
+            for spelling in [name, *alternates]:
+                key = normalize(spelling)
+                self._exact.setdefault(key, place_id)
+                entries.append((key, 0, place_id))
+                words = key.split(' ')
+                for n in range(1, len(words)):
+                    entries.append((' '.join(words[n:]), 1, place_id))
+        entries.sort()
+        self._keys = [entry[0] for entry in entries]
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """Exact match on any normalized spelling"""
+        place_id = self._exact.get(normalize(name))
+        return self.places[place_id] if place_id is not None else None
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Places with a spelling (or a word of one) starting with the query: exact first, then
+        full-name prefixes, then word prefixes"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        best: Dict[int, Tuple[int, int]] = {}
+        position = bisect.bisect_left(self._keys, prefix)
+        while position < len(self._keys) and self._keys[position].startswith(prefix):
+            key, rank, place_id = self._entries[position]
+            score = (0 if key == prefix and rank == 0 else rank + 1, len(key))
+            if place_id not in best or score < best[place_id]:
+                best[place_id] = score
+            position += 1
+        ordered = sorted(best, key=lambda place_id: (best[place_id], place_id))
+        return [self.places[place_id] for place_id in ordered[:limit]]
+
+
+default = Gazetteer(PLACES)
+
+
+def lookup(name: str) -> Optional[Dict[str, Any]]:
+    return default.lookup(name)
+
+
+def search(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    return default.search(query, limit)
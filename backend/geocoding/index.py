@@ -1,58 +1,226 @@
 """
-Business: Search for cities and villages using geocoding API
-Args: event with httpMethod, queryStringParameters (query for search)
-Returns: HTTP response with list of locations (name, lat, lon, country, region)
+Business: Search for cities and villages in the local gazetteer, GeoNames index and geocoding API
+Args: event with httpMethod, queryStringParameters (query for search, or "lat,lon" for reverse geocoding;
+      limit, default 20; action=cache-stats); POST body {'names': [...]} for batch geocoding
+Returns: HTTP response with list of locations (name, lat, lon, country, region); NDJSON, one line per
+         name in input order, for batches
 """
 
 import json
-import urllib.request
+import os
+import re
 import urllib.parse
-from typing import Dict, Any, List
-
-RUSSIAN_CITIES = {
-    'тольятти': {'name': 'Тольятти', 'lat': 53.5303, 'lon': 49.3461, 'admin1': 'Самарская область'},
-    'саранск': {'name': 'Саранск', 'lat': 54.1838, 'lon': 45.1749, 'admin1': 'Мордовия'},
-    'краснодар': {'name': 'Краснодар', 'lat': 45.0355, 'lon': 38.9753, 'admin1': 'Краснодарский край'},
-    'воронеж': {'name': 'Воронеж', 'lat': 51.6605, 'lon': 39.2005, 'admin1': 'Воронежская область'},
-    'пермь': {'name': 'Пермь', 'lat': 58.0105, 'lon': 56.2502, 'admin1': 'Пермский край'},
-    'волгоград': {'name': 'Волгоград', 'lat': 48.7080, 'lon': 44.5133, 'admin1': 'Волгоградская область'},
-    'тюмень': {'name': 'Тюмень', 'lat': 57.1522, 'lon': 65.5272, 'admin1': 'Тюменская область'},
-    'барнаул': {'name': 'Барнаул', 'lat': 53.3480, 'lon': 83.7799, 'admin1': 'Алтайский край'},
-    'иркутск': {'name': 'Иркутск', 'lat': 52.2978, 'lon': 104.2964, 'admin1': 'Иркутская область'},
-    'владивосток': {'name': 'Владивосток', 'lat': 43.1332, 'lon': 131.9113, 'admin1': 'Приморский край'},
-    'ярославль': {'name': 'Ярославль', 'lat': 57.6261, 'lon': 39.8845, 'admin1': 'Ярославская область'},
-    'тула': {'name': 'Тула', 'lat': 54.1934, 'lon': 37.6156, 'admin1': 'Тульская область'},
-    'севастополь': {'name': 'Севастополь', 'lat': 44.6160, 'lon': 33.5252, 'admin1': 'Севастополь'},
-    'махачкала': {'name': 'Махачкала', 'lat': 42.9849, 'lon': 47.5047, 'admin1': 'Дагестан'},
-    'хабаровск': {'name': 'Хабаровск', 'lat': 48.4827, 'lon': 135.0838, 'admin1': 'Хабаровский край'},
-    'оренбург': {'name': 'Оренбург', 'lat': 51.7727, 'lon': 55.0988, 'admin1': 'Оренбургская область'},
-    'новокузнецк': {'name': 'Новокузнецк', 'lat': 53.7577, 'lon': 87.1099, 'admin1': 'Кемеровская область'},
-    'рязань': {'name': 'Рязань', 'lat': 54.6269, 'lon': 39.6916, 'admin1': 'Рязанская область'},
-    'томск': {'name': 'Томск', 'lat': 56.4977, 'lon': 84.9744, 'admin1': 'Томская область'},
-    'кемерово': {'name': 'Кемерово', 'lat': 55.3547, 'lon': 86.0861, 'admin1': 'Кемеровская область'},
-    'астрахань': {'name': 'Астрахань', 'lat': 46.3497, 'lon': 48.0408, 'admin1': 'Астраханская область'},
-    'пенза': {'name': 'Пенза', 'lat': 53.2001, 'lon': 45.0000, 'admin1': 'Пензенская область'},
-    'липецк': {'name': 'Липецк', 'lat': 52.6097, 'lon': 39.5708, 'admin1': 'Липецкая область'},
-    'киров': {'name': 'Киров', 'lat': 58.6035, 'lon': 49.6679, 'admin1': 'Кировская область'},
-    'чебоксары': {'name': 'Чебоксары', 'lat': 56.1439, 'lon': 47.2489, 'admin1': 'Чувашия'},
-    'калининград': {'name': 'Калининград', 'lat': 54.7104, 'lon': 20.4522, 'admin1': 'Калининградская область'},
-    'брянск': {'name': 'Брянск', 'lat': 53.2521, 'lon': 34.3717, 'admin1': 'Брянская область'},
-    'иваново': {'name': 'Иваново', 'lat': 57.0000, 'lon': 40.9833, 'admin1': 'Ивановская область'},
-    'магнитогорск': {'name': 'Магнитогорск', 'lat': 53.4078, 'lon': 58.9797, 'admin1': 'Челябинская область'},
-    'курск': {'name': 'Курск', 'lat': 51.7373, 'lon': 36.1873, 'admin1': 'Курская область'},
-    'тверь': {'name': 'Тверь', 'lat': 56.8587, 'lon': 35.9176, 'admin1': 'Тверская область'},
-    'нижний тагил': {'name': 'Нижний Тагил', 'lat': 57.9197, 'lon': 59.9650, 'admin1': 'Свердловская область'},
-    'ставрополь': {'name': 'Ставрополь', 'lat': 45.0428, 'lon': 41.9734, 'admin1': 'Ставропольский край'},
-    'улан-удэ': {'name': 'Улан-Удэ', 'lat': 51.8272, 'lon': 107.6063, 'admin1': 'Бурятия'},
-    'сочи': {'name': 'Сочи', 'lat': 43.6028, 'lon': 39.7342, 'admin1': 'Краснодарский край'},
-    'калуга': {'name': 'Калуга', 'lat': 54.5293, 'lon': 36.2754, 'admin1': 'Калужская область'},
-    'владимир': {'name': 'Владимир', 'lat': 56.1294, 'lon': 40.4063, 'admin1': 'Владимирская область'},
-    'архангельск': {'name': 'Архангельск', 'lat': 64.5401, 'lon': 40.5433, 'admin1': 'Архангельская область'},
-    'мурманск': {'name': 'Мурманск', 'lat': 68.9585, 'lon': 33.0827, 'admin1': 'Мурманская область'},
-    'якутск': {'name': 'Якутск', 'lat': 62.0355, 'lon': 129.6755, 'admin1': 'Якутия'},
-    'смоленск': {'name': 'Смоленск', 'lat': 54.7824, 'lon': 32.0454, 'admin1': 'Смоленская область'},
-    'сургут': {'name': 'Сургут', 'lat': 61.2500, 'lon': 73.4167, 'admin1': 'Ханты-Мансийский АО'}
-}
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import gazetteer
+from autocomplete_cache import PrefixCache
+import fuzzy
+import geonames_index
+import http_client
+import result_merge
+import spatial
+
+# The remote API is skipped when the local indexes already return this many places
+LOCAL_MIN_RESULTS = int(os.environ.get('GEOCODING_LOCAL_MIN_RESULTS', '5'))
+REMOTE_COUNT = 20
+SEARCH_LIMIT = 20
+MAX_LIMIT = 50
+FUZZY_RESULTS = 5
+
+REVERSE_MAX_KM = float(os.environ.get('GEOCODING_REVERSE_MAX_KM', '50'))
+REVERSE_RESULTS = 5
+COORDINATES_PATTERN = re.compile(r'^\s*(-?\d{1,2}(?:\.\d+)?)\s*[,;\s]\s*(-?\d{1,3}(?:\.\d+)?)\s*$')
+
+MAX_BATCH_NAMES = int(os.environ.get('GEOCODING_BATCH_MAX_NAMES', '2000'))
+BATCH_REMOTE_COUNT = 5
+
+search_cache = PrefixCache()
+# Bounds the concurrent upstream calls of one batch; the HTTP pool keeps one connection per worker
+remote_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('GEOCODING_BATCH_WORKERS', '4')))
+
+local_grid = spatial.GridIndex((place['lat'], place['lon']) for place in gazetteer.default.places)
+
+_fuzzy_index: Optional[fuzzy.FuzzyIndex] = None
+
+def is_local_duplicate(location: Dict[str, Any], local_results: List[Dict[str, Any]]) -> bool:
+    """True if the API result is a city already returned from the local gazetteer"""
+    for local in local_results:
+        if (location.get('name') == local['name']
+                and abs((location.get('latitude') or 0) - local['lat']) < 0.1
+                and abs((location.get('longitude') or 0) - local['lon']) < 0.1):
+            return True
+    return False
+
+def format_local(place: Dict[str, Any]) -> Dict[str, Any]:
+    country_code = place.get('country_code', 'RU')
+    admin1 = place.get('admin1', '')
+    return {
+        'name': place['name'],
+        'lat': place['lat'],
+        'lon': place['lon'],
+        'country': 'Россия' if country_code == 'RU' else country_code,
+        'admin1': admin1,
+        'display_name': f"{place['name']}, {admin1}" if admin1 else place['name'],
+        'population': place.get('population', 0),
+        'country_code': country_code
+    }
+
+def search_local(query: str, limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+    """Built-in gazetteer matches followed by the memory-mapped GeoNames index when one is deployed"""
+    results = [format_local(place) for place in gazetteer.search(query, limit)]
+    index = geonames_index.load()
+    if index is not None and len(results) < limit:
+        for place in index.search(query, limit):
+            candidate = {'name': place['name'], 'latitude': place['lat'], 'longitude': place['lon']}
+            if not is_local_duplicate(candidate, results):
+                results.append(format_local(place))
+    return results[:limit]
+
+def get_fuzzy_index() -> fuzzy.FuzzyIndex:
+    """Built-in spellings plus the major GeoNames places, indexed once per warm instance"""
+    global _fuzzy_index
+    if _fuzzy_index is None:
+        entries = [
+            (spelling, ('gazetteer', place_id), 0)
+            for place_id, (name, _, _, _, alternates) in enumerate(gazetteer.PLACES)
+            for spelling in [name, *alternates]
+        ]
+        index = geonames_index.load()
+        if index is not None:
+            entries += [(key, ('geonames', place_id), population) for key, place_id, population in index.major_keys()]
+        _fuzzy_index = fuzzy.FuzzyIndex(entries)
+    return _fuzzy_index
+
+def search_fuzzy(query: str, known: List[Dict[str, Any]], limit: int = FUZZY_RESULTS) -> Tuple[List[Dict[str, Any]], bool]:
+    """Near matches for misspelled or transliterated queries that are not already in `known`,
+    and whether the best of them is a whole name (the query was a complete name with a typo)"""
+    matches = get_fuzzy_index().search(query, limit)
+    results: List[Dict[str, Any]] = []
+    for match in matches:
+        source, place_id = match['place']
+        place = gazetteer.default.places[place_id] if source == 'gazetteer' else geonames_index.load().place(place_id)
+        candidate = {'name': place['name'], 'latitude': place['lat'], 'longitude': place['lon']}
+        if not is_local_duplicate(candidate, known + results):
+            results.append({**format_local(place), 'fuzzy': True})
+    return results, bool(matches) and matches[0]['whole']
+
+def parse_limit(value: Optional[str]) -> int:
+    if value in (None, ''):
+        return SEARCH_LIMIT
+    limit = int(value)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+    return limit
+
+def format_remote(location: Dict[str, Any]) -> Dict[str, Any]:
+    location_data = {
+        'name': location.get('name', ''),
+        'lat': location.get('latitude'),
+        'lon': location.get('longitude'),
+        'country': location.get('country', ''),
+        'admin1': location.get('admin1', ''),
+        'admin2': location.get('admin2', ''),
+        'admin3': location.get('admin3', ''),
+        'admin4': location.get('admin4', ''),
+        'population': location.get('population', 0),
+        'timezone': location.get('timezone', ''),
+        'country_code': location.get('country_code', '')
+    }
+    
+    display_parts = [location_data['name']]
+    
+    if location_data.get('admin4'):
+        display_parts.append(location_data['admin4'])
+    elif location_data.get('admin3'):
+        display_parts.append(location_data['admin3'])
+    elif location_data.get('admin2'):
+        display_parts.append(location_data['admin2'])
+    elif location_data.get('admin1'):
+        display_parts.append(location_data['admin1'])
+    
+    if location_data['country'] and location_data['country'] != 'Россия':
+        display_parts.append(location_data['country'])
+    
+    location_data['display_name'] = ', '.join(display_parts)
+    return location_data
+
+def parse_coordinates(query: str) -> Optional[Tuple[float, float]]:
+    """(lat, lon) when the query is a "lat,lon" pair, e.g. from browser geolocation"""
+    match = COORDINATES_PATTERN.match(query)
+    if not match:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+def reverse_geocode(lat: float, lon: float, limit: int = REVERSE_RESULTS) -> List[Dict[str, Any]]:
+    """Nearest named places from the local indexes, closest first, without any network call"""
+    candidates = [
+        {**format_local(gazetteer.default.places[place_id]), 'distance_km': round(distance, 2)}
+        for distance, place_id in local_grid.nearest(lat, lon, limit, REVERSE_MAX_KM)
+    ]
+    index = geonames_index.load()
+    if index is not None:
+        for place in index.nearest(lat, lon, limit, REVERSE_MAX_KM):
+            candidate = {'name': place['name'], 'latitude': place['lat'], 'longitude': place['lon']}
+            if not is_local_duplicate(candidate, candidates):
+                candidates.append({**format_local(place), 'distance_km': place['distance_km']})
+    candidates.sort(key=lambda place: place['distance_km'])
+    return candidates[:limit]
+
+def resolve_local(query: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """(place, source) for a name the local indexes know exactly or as a whole-name near match"""
+    best = result_merge.merge([search_local(query, LOCAL_MIN_RESULTS)], query, 1)
+    if best and result_merge.match_tier(best[0], gazetteer.normalize(query)) == result_merge.EXACT:
+        return best[0], 'local'
+    near, whole = search_fuzzy(query, [], 1)
+    if near and whole:
+        return near[0], 'fuzzy'
+    return None, ''
+
+def resolve_remote(query: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    encoded_query = urllib.parse.quote(query)
+    api_url = f"https://geocoding-api.open-meteo.com/v1/search?name={encoded_query}&count={BATCH_REMOTE_COUNT}&language=ru&format=json"
+    locations = http_client.get_json(api_url).get('results') or []
+    best = result_merge.merge([(format_remote(location) for location in locations)], query, 1)
+    return (best[0], 'remote') if best else (None, '')
+
+def geocode_batch(names: List[Any]) -> Iterator[str]:
+    """NDJSON lines in input order. Every distinct name is tried locally first; the rest go to the
+    remote API on remote_pool, and each line is emitted as soon as it and all earlier ones are resolved."""
+    resolved: Dict[str, Tuple[Optional[Dict[str, Any]], str]] = {}
+    pending: Dict[str, Future] = {}
+    for name in names:
+        if not isinstance(name, str) or len(name.strip()) < 2:
+            continue
+        key = gazetteer.normalize(name)
+        if key in resolved or key in pending:
+            continue
+        place, source = resolve_local(name)
+        if place is not None:
+            resolved[key] = (place, source)
+        else:
+            pending[key] = remote_pool.submit(resolve_remote, name)
+    
+    for position, name in enumerate(names):
+        line: Dict[str, Any] = {'index': position, 'query': name}
+        if not isinstance(name, str) or len(name.strip()) < 2:
+            line['error'] = 'Expected a place name of at least 2 characters'
+        else:
+            key = gazetteer.normalize(name)
+            try:
+                place, source = resolved[key] if key in resolved else pending[key].result()
+            except Exception as e:
+                print(f"Batch geocoding error for {name!r}: {e}")
+                place, source = None, ''
+                line['error'] = str(e)
+            if place is not None:
+                line.update(source=source, result=place)
+            elif 'error' not in line:
+                line['error'] = 'Not found'
+        yield json.dumps(line, ensure_ascii=False) + '\n'
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -62,7 +230,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
@@ -75,7 +243,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
@@ -83,6 +251,55 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    if method == 'POST':
+        try:
+            names = json.loads(event.get('body') or '{}').get('names')
+            if not isinstance(names, list):
+                raise ValueError('names must be a list')
+        except (ValueError, AttributeError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': f'Invalid batch request: {e}'}),
+                'isBase64Encoded': False
+            }
+        if len(names) > MAX_BATCH_NAMES:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': f'Too many names, maximum is {MAX_BATCH_NAMES}'}),
+                'isBase64Encoded': False
+            }
+        try:
+            # The function runtime sends one body, so the lines are joined as they are produced
+            body = ''.join(geocode_batch(names))
+        except Exception as e:
+            print(f"Batch geocoding error: {e}")
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/x-ndjson',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': body,
+            'isBase64Encoded': False
+        }
+    
     if method != 'GET':
         return {
             'statusCode': 405,
@@ -97,6 +314,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     params = event.get('queryStringParameters') or {}
     query = params.get('query', '')
     
+    if params.get('action') == 'cache-stats':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'searchCache': search_cache.stats(), 'httpClient': http_client.stats()}),
+            'isBase64Encoded': False
+        }
+    
     if not query or len(query) < 2:
         return {
             'statusCode': 200,
@@ -108,69 +336,90 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    coordinates = parse_coordinates(query)
+    if coordinates:
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'X-Source': 'reverse'
+            },
+            'body': json.dumps({'results': reverse_geocode(*coordinates)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
     try:
-        results: List[Dict[str, Any]] = []
-        query_lower = query.lower()
+        limit = parse_limit(params.get('limit'))
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e), 'results': []}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    cached, cache_state = search_cache.get(query)
+    if cached is not None:
+        # Results filtered from a shorter prefix are re-ranked against the longer query
+        if cache_state == 'PREFIX':
+            cached = result_merge.merge([cached], query, MAX_LIMIT)
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'X-Cache': cache_state
+            },
+            'body': json.dumps({'results': cached[:limit]}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        local_results: List[Dict[str, Any]] = search_local(query, MAX_LIMIT)
+        local_count = len(local_results)
         
-        for city_key, city_data in RUSSIAN_CITIES.items():
-            if query_lower in city_key or city_key.startswith(query_lower):
-                results.append({
-                    'name': city_data['name'],
-                    'lat': city_data['lat'],
-                    'lon': city_data['lon'],
-                    'country': 'Россия',
-                    'admin1': city_data['admin1'],
-                    'display_name': f"{city_data['name']}, {city_data['admin1']}",
-                    'population': 0,
-                    'country_code': 'RU'
-                })
+        # A query with no prefix match but a whole-name near match is a typo or another spelling;
+        # the remote API would not find it either
+        fuzzy_results: List[Dict[str, Any]] = []
+        corrected = False
+        if local_count < LOCAL_MIN_RESULTS:
+            fuzzy_results, whole = search_fuzzy(query, local_results)
+            corrected = local_count == 0 and whole
         
-        encoded_query = urllib.parse.quote(query)
-        api_url = f"https://geocoding-api.open-meteo.com/v1/search?name={encoded_query}&count=20&language=ru&format=json"
+        remote_locations: List[Dict[str, Any]] = []
+        remote_called = local_count < LOCAL_MIN_RESULTS and not corrected
+        if remote_called:
+            encoded_query = urllib.parse.quote(query)
+            api_url = f"https://geocoding-api.open-meteo.com/v1/search?name={encoded_query}&count={REMOTE_COUNT}&language=ru&format=json"
+            
+            remote_locations = http_client.get_json(api_url).get('results') or []
         
-        with urllib.request.urlopen(api_url) as response:
-            data = json.loads(response.read().decode())
+        # Duplicates across sources collapse into the local entry; only the best MAX_LIMIT are kept
+        # so the cache can serve any smaller limit
+        results = result_merge.merge(
+            [local_results, fuzzy_results, (format_remote(location) for location in remote_locations)],
+            query, MAX_LIMIT
+        )
         
-        if 'results' in data:
-            for location in data['results']:
-                location_data = {
-                    'name': location.get('name', ''),
-                    'lat': location.get('latitude'),
-                    'lon': location.get('longitude'),
-                    'country': location.get('country', ''),
-                    'admin1': location.get('admin1', ''),
-                    'admin2': location.get('admin2', ''),
-                    'admin3': location.get('admin3', ''),
-                    'admin4': location.get('admin4', ''),
-                    'population': location.get('population', 0),
-                    'timezone': location.get('timezone', ''),
-                    'country_code': location.get('country_code', '')
-                }
-                
-                display_parts = [location_data['name']]
-                
-                if location_data.get('admin4'):
-                    display_parts.append(location_data['admin4'])
-                elif location_data.get('admin3'):
-                    display_parts.append(location_data['admin3'])
-                elif location_data.get('admin2'):
-                    display_parts.append(location_data['admin2'])
-                elif location_data.get('admin1'):
-                    display_parts.append(location_data['admin1'])
-                
-                if location_data['country'] and location_data['country'] != 'Россия':
-                    display_parts.append(location_data['country'])
-                
-                location_data['display_name'] = ', '.join(display_parts)
-                results.append(location_data)
+        # Complete when no source and not the merge was truncated and nothing came from near matches,
+        # so longer queries can be filtered from it
+        complete = (remote_called and not fuzzy_results and local_count < MAX_LIMIT
+                    and len(remote_locations) < REMOTE_COUNT and len(results) < MAX_LIMIT)
+        search_cache.put(query, results, complete)
         
         return {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
+                'Access-Control-Allow-Origin': '*',
+                'X-Cache': 'MISS',
+                'X-Source': '+'.join(['local'] + (['fuzzy'] if fuzzy_results else []) + (['remote'] if remote_called else []))
             },
-            'body': json.dumps({'results': results}, ensure_ascii=False),
+            'body': json.dumps({'results': results[:limit]}, ensure_ascii=False),
             'isBase64Encoded': False
         }
         
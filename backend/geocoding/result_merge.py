@@ -0,0 +1,66 @@
+"""
+Merge of local, near-match and remote search results: one entry per place (same spelling within
+DUPLICATE_DEGREES), ranked by match quality and population, with only the best `limit` selected
+through a bounded heap instead of sorting every candidate
+"""
+
+import heapq
+from typing import Any, Dict, Iterable, List, Tuple
+
+from fuzzy import skeleton
+from gazetteer import normalize
+
+DUPLICATE_DEGREES = 0.1
+
+# Upstream matches through another spelling are real matches; near matches are guesses
+EXACT, PREFIX, WORD_PREFIX, OTHER, NEAR = range(5)
+
+
+def match_tier(result: Dict[str, Any], query: str) -> int:
+    """How the result's name relates to the normalized query; OTHER when the upstream matched it
+    through a spelling the result does not carry"""
+    if result.get('fuzzy'):
+        return NEAR
+    name = normalize(result.get('name', ''))
+    if name == query or skeleton(name) == skeleton(query):
+        return EXACT
+    if name.startswith(query):
+        return PREFIX
+    if any(word.startswith(query) for word in name.split(' ')[1:]):
+        return WORD_PREFIX
+    return OTHER
+
+
+def merge(sources: Iterable[Iterable[Dict[str, Any]]], query: str, limit: int) -> List[Dict[str, Any]]:
+    """Best `limit` distinct places from the sources, earlier sources winning duplicates.
+
+    A duplicate still lends its population to the entry kept, so a built-in city without one
+    ranks as the upstream's copy would.
+    """
+    key = normalize(query)
+    candidates: List[Dict[str, Any]] = []
+    seen: Dict[str, List[Tuple[float, float, int]]] = {}
+    for source in sources:
+        for result in source:
+            lat, lon = result.get('lat'), result.get('lon')
+            if lat is None or lon is None:
+                continue
+            spelling = skeleton(result.get('name', ''))
+            duplicate = None
+            for seen_lat, seen_lon, position in seen.get(spelling, ()):
+                if abs(lat - seen_lat) < DUPLICATE_DEGREES and abs(lon - seen_lon) < DUPLICATE_DEGREES:
+                    duplicate = position
+                    break
+            if duplicate is not None:
+                kept = candidates[duplicate]
+                if (result.get('population') or 0) > (kept.get('population') or 0):
+                    candidates[duplicate] = {**kept, 'population': result['population']}
+                continue
+            seen.setdefault(spelling, []).append((lat, lon, len(candidates)))
+            candidates.append(result)
+
+    ranked = heapq.nsmallest(
+        limit, range(len(candidates)),
+        key=lambda n: (match_tier(candidates[n], key), -(candidates[n].get('population') or 0), n)
+    )
+    return [candidates[n] for n in ranked]
@@ -0,0 +1,76 @@
+"""
+Nearest-place search over fixed lat/lon grid buckets: cells are visited in rings around the query
+point until the k-th best distance is closer than anything an outer ring could contain
+"""
+
+import heapq
+import math
+from typing import Callable, Dict, Iterable, List, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+CELL_DEGREES = 1.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cell_of(lat: float, lon: float, size: float = CELL_DEGREES) -> Tuple[int, int]:
+    return math.floor(lat / size), math.floor(lon / size)
+
+
+def cell_key(row: int, col: int, size: float = CELL_DEGREES) -> int:
+    """Single integer id of a grid cell, longitude wrapped"""
+    cols = round(360 / size)
+    return (row + round(90 / size)) * cols + (col + round(180 / size)) % cols
+
+
+def nearest(lat: float, lon: float, k: int, bucket: Callable[[int], Iterable[Tuple[int, float, float]]],
+            max_km: float, size: float = CELL_DEGREES) -> List[Tuple[float, int]]:
+    """Up to k (distance_km, place_id) pairs within max_km, closest first.
+
+    `bucket(cell_key)` yields (place_id, lat, lon) for the places in one cell.
+    """
+    row, col = cell_of(lat, lon, size)
+    best: List[Tuple[float, int]] = []  # max-heap via negated distances
+    ring = 0
+    while True:
+        for r in range(row - ring, row + ring + 1):
+            if not -90 / size <= r < 90 / size:
+                continue
+            cols = [c for c in range(col - ring, col + ring + 1)] if abs(r - row) == ring else [col - ring, col + ring]
+            for c in dict.fromkeys(cols):
+                for place_id, place_lat, place_lon in bucket(cell_key(r, c, size)):
+                    distance = haversine_km(lat, lon, place_lat, place_lon)
+                    if distance > max_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, place_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, place_id))
+
+        # Anything in ring + 1 or beyond is at least this far away (cells narrow towards the poles)
+        reach_lat = min(89.9, abs(lat) + (ring + 1) * size)
+        bound = ring * size * KM_PER_DEGREE * math.cos(math.radians(reach_lat))
+        if bound > max_km or (len(best) == k and bound >= -best[0][0]) or ring * size >= 180:
+            break
+        ring += 1
+    return sorted((-distance, place_id) for distance, place_id in best)
+
+
+class GridIndex:
+    """In-memory grid buckets for a small point set"""
+
+    def __init__(self, points: Iterable[Tuple[float, float]], size: float = CELL_DEGREES):
+        self.size = size
+        self._cells: Dict[int, List[Tuple[int, float, float]]] = {}
+        for place_id, (lat, lon) in enumerate(points):
+            self._cells.setdefault(cell_key(*cell_of(lat, lon, size), size), []).append((place_id, lat, lon))
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: float) -> List[Tuple[float, int]]:
+        return nearest(lat, lon, k, lambda key: self._cells.get(key, ()), max_km, self.size)
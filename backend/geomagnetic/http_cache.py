@@ -0,0 +1,132 @@
+"""
+Conditional GET support: ETag from the response content, If-None-Match -> 304,
+Cache-Control max-age aligned with the provider's next expected update,
+and gzip/brotli response encoding negotiated from Accept-Encoding
+"""
+
+import base64
+import gzip
+import hashlib
+import os
+import time
+from typing import Dict, Any, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+
+
+def etag_for(body: str) -> str:
+    return '"' + hashlib.sha1(body.encode()).hexdigest()[:20] + '"'
+
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    """Case-insensitive request header lookup"""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def accepted_encodings(event: Dict[str, Any]) -> Dict[str, float]:
+    """Accept-Encoding codings with their q-values"""
+    result = {}
+    for part in (get_header(event, 'Accept-Encoding') or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        result[coding.strip().lower()] = q
+    return result
+
+
+def choose_encoding(event: Dict[str, Any]) -> Optional[str]:
+    accepted = accepted_encodings(event)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    for coding in candidates:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def encode_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """Compress a text response body when the client accepts it and the body is large enough.
+
+    The compressed body is returned base64-encoded; X-Payload-Size reports plain and encoded sizes.
+    """
+    raw = response['body'].encode()
+    headers = {**response['headers'], 'Vary': 'Accept-Encoding'}
+    coding = choose_encoding(event) if len(raw) >= COMPRESSION_MIN_BYTES else None
+    if coding is None:
+        headers['X-Payload-Size'] = str(len(raw))
+        return {**response, 'headers': headers}
+
+    if coding == 'br':
+        encoded = brotli.compress(raw, quality=5)
+    else:
+        encoded = gzip.compress(raw, compresslevel=6, mtime=0)
+
+    headers['Content-Encoding'] = coding
+    headers['X-Payload-Size'] = f'{len(raw)};{coding}={len(encoded)}'
+    if 'ETag' in headers:
+        headers['ETag'] = headers['ETag'][:-1] + f'-{coding}"'
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(encoded).decode(),
+        'isBase64Encoded': True
+    }
+
+
+def seconds_until_next(period: int, lag: int = 0, now: Optional[float] = None) -> int:
+    """Seconds until the next update on a fixed UTC cadence (period seconds, published `lag` seconds after the boundary)"""
+    now = time.time() if now is None else now
+    remaining = period - ((now - lag) % period)
+    return max(60, int(remaining))
+
+
+def conditional_response(event: Dict[str, Any], body: str, headers: Dict[str, str], max_age: int) -> Dict[str, Any]:
+    """200 with ETag/Cache-Control (compressed when accepted), or 304 without a body when If-None-Match matches"""
+    etag = etag_for(body)
+    cache_headers = {
+        **headers,
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={max_age}',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match:
+        # Compressed variants carry the coding as an ETag suffix; they validate the same content
+        candidates = [
+            tag.strip().removeprefix('W/').replace('-br"', '"').replace('-gzip"', '"')
+            for tag in if_none_match.split(',')
+        ]
+        if '*' in candidates or etag in candidates:
+            coding = choose_encoding(event) if len(body.encode()) >= COMPRESSION_MIN_BYTES else None
+            return {
+                'statusCode': 304,
+                'headers': {
+                    **{key: value for key, value in cache_headers.items() if key != 'Content-Type'},
+                    'ETag': etag[:-1] + f'-{coding}"' if coding else etag,
+                    'Vary': 'Accept-Encoding'
+                },
+                'body': '',
+                'isBase64Encoded': False
+            }
+
+    return encode_response(event, {
+        'statusCode': 200,
+        'headers': cache_headers,
+        'body': body,
+        'isBase64Encoded': False
+    })
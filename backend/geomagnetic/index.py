@@ -1,6 +1,105 @@
 import json
-import urllib.request
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Tuple
+
+import circuit_breaker
+import http_cache
+import http_client
+import kp_history
+import shared_cache
+
+CURRENT_URL = 'https://services.swpc.noaa.gov/products/noaa-planetary-k-index.json'
+FORECAST_URL = 'https://services.swpc.noaa.gov/products/noaa-planetary-k-index-forecast.json'
+
+# Planetary Kp is issued for 3-hour UTC intervals, published a few minutes after each one closes
+KP_PERIOD = 3 * 3600
+KP_PUBLISH_LAG = 300
+# How soon to look again when NOAA has not yet published the interval that just closed
+LATE_RECHECK_SECONDS = 300
+
+# Browser cache lifetime for a last-good payload served while NOAA is failing
+STALE_MAX_AGE = 60
+
+# The products are global, so one copy per warm instance serves every request until the next publication:
+# name -> (expires_at, payload, stale)
+_products: Dict[str, Tuple[float, Any, bool]] = {}
+_products_lock = threading.Lock()
+product_stats = {'hits': 0, 'refreshes': 0, 'stale_if_error': 0}
+
+kp_ring = kp_history.KpRing()
+_ring_restored = False
+
+def fetch_json(url: str):
+    return circuit_breaker.for_url(url).call(lambda: http_client.get_json(url))
+
+def expected_latest(now: float) -> str:
+    """Time tag of the interval that closed at the last boundary NOAA has had time to publish"""
+    start = ((now - KP_PUBLISH_LAG) // KP_PERIOD) * KP_PERIOD - KP_PERIOD
+    return datetime.fromtimestamp(start, tz=timezone.utc).strftime(kp_history.TIME_FORMAT)
+
+def product_ttl(table: Any, now: float) -> int:
+    """Until the next publication, or a short recheck while the newest interval is still missing"""
+    newest = table[-1][0] if isinstance(table, list) and len(table) > 1 else ''
+    if newest < expected_latest(now):
+        return LATE_RECHECK_SECONDS
+    return http_cache.seconds_until_next(KP_PERIOD, lag=KP_PUBLISH_LAG, now=now)
+
+def get_products() -> Tuple[Any, Any, bool, float]:
+    """(current table, forecast table, stale, expires_at) from the process cache, the shared cache or NOAA"""
+    now = time.time()
+    with _products_lock:
+        entry = _products.get('kp')
+        if entry is not None and entry[0] > now:
+            product_stats['hits'] += 1
+            return entry[1][0], entry[1][1], entry[2], entry[0]
+        
+        product_stats['refreshes'] += 1
+        try:
+            # The shared row gets the same short lifetime when the newest interval is missing, so the
+            # recheck reaches NOAA instead of rereading the table every instance already has
+            current_data, current_stale = shared_cache.fetch_or_stale(
+                'noaa', 0, 0, 'kp-current', lambda table: product_ttl(table, now),
+                lambda: fetch_json(CURRENT_URL)
+            )
+            forecast_data, forecast_stale = shared_cache.fetch_or_stale(
+                'noaa', 0, 0, 'kp-forecast', http_cache.seconds_until_next(KP_PERIOD, lag=KP_PUBLISH_LAG, now=now),
+                lambda: fetch_json(FORECAST_URL)
+            )
+        except Exception as e:
+            if entry is None:
+                raise
+            # NOAA is failing and no shared row is usable: the expired copy is still the latest known,
+            # and it is kept for STALE_MAX_AGE before NOAA is tried again
+            print(f"Kp refresh error, serving the expired copy: {e}")
+            product_stats['stale_if_error'] += 1
+            _products['kp'] = (now + STALE_MAX_AGE, entry[1], True)
+            return entry[1][0], entry[1][1], True, now + STALE_MAX_AGE
+        stale = current_stale or forecast_stale
+        ttl = STALE_MAX_AGE if stale else product_ttl(current_data, now)
+        _products['kp'] = (now + ttl, (current_data, forecast_data), stale)
+        record_history(current_data)
+        return current_data, forecast_data, stale, now + ttl
+
+def record_history(current_data: Any) -> None:
+    """Add readings newer than the ring's last one; the ring is restored from Postgres on first use"""
+    global _ring_restored
+    if not _ring_restored:
+        _ring_restored = True
+        if kp_history.enabled():
+            kp_ring.extend(kp_history.load())
+    fresh = kp_ring.ingest(current_data)
+    if fresh and kp_history.enabled():
+        kp_history.save(fresh)
+
+def parse_history_days(value) -> int:
+    if value in (None, ''):
+        return 0
+    days = int(value)
+    if not 0 <= days <= kp_history.HISTORY_DAYS:
+        raise ValueError(f'history_days must be between 0 and {kp_history.HISTORY_DAYS}')
+    return days
 
 def handler(event: dict, context) -> dict:
     '''Получение данных о магнитных бурях с API NOAA'''
@@ -12,22 +111,41 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Accept-Encoding'
             },
             'body': ''
         }
 
     if method == 'GET':
         try:
-            current_url = 'https://services.swpc.noaa.gov/products/noaa-planetary-k-index.json'
-            forecast_url = 'https://services.swpc.noaa.gov/products/noaa-planetary-k-index-forecast.json'
-
-            with urllib.request.urlopen(current_url) as response:
-                current_data = json.loads(response.read().decode())
-
-            with urllib.request.urlopen(forecast_url) as response:
-                forecast_data = json.loads(response.read().decode())
-
+            params = event.get('queryStringParameters') or {}
+            if params.get('action') == 'cache-stats':
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'products': product_stats,
+                        'history': {'readings': len(kp_ring), 'lastSeen': kp_ring.last_seen, 'rowsParsed': kp_ring.rows_parsed},
+                        'httpClient': http_client.stats()
+                    })
+                }
+            try:
+                history_days = parse_history_days(params.get('history_days'))
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)})
+                }
+            
+            current_data, forecast_data, stale, expires_at = get_products()
+            
             current_kp = 0
             if len(current_data) > 1:
                 latest_entry = current_data[-1]
@@ -53,15 +171,23 @@ def handler(event: dict, context) -> dict:
                 },
                 'forecast': forecast
             }
+            if history_days:
+                result['history'] = [
+                    {'time': time_tag, 'kp': kp, 'level': get_level_from_kp(kp)}
+                    for time_tag, kp in kp_ring.since(history_days)
+                ]
+            if stale:
+                result['stale'] = True
 
-            return {
-                'statusCode': 200,
-                'headers': {
+            return http_cache.conditional_response(
+                event,
+                json.dumps(result),
+                {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(result)
-            }
+                max_age=STALE_MAX_AGE if stale else max(60, int(expires_at - time.time()))
+            )
 
         except Exception as e:
             return {
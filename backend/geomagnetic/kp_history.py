@@ -0,0 +1,118 @@
+"""
+Bounded ring buffer of planetary Kp readings (one per 3-hour interval) mirrored in Postgres (kp_history
+table): each NOAA payload is parsed only from the newest reading already held, so a warm instance does
+constant work per update, and a cold one restores the last HISTORY_DAYS from the table
+"""
+
+import os
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+HISTORY_DAYS = 30
+CAPACITY = HISTORY_DAYS * 8
+# NOAA time tags, e.g. '2026-10-17 06:00:00.000'; they sort as strings
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.000'
+
+_conn = None
+
+
+def enabled() -> bool:
+    return bool(os.environ.get('DATABASE_URL'))
+
+
+def _get_connection():
+    global _conn
+    if _conn is None or _conn.closed:
+        _conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _conn.autocommit = True
+    return _conn
+
+
+def _reset_connection() -> None:
+    global _conn
+    try:
+        if _conn is not None:
+            _conn.close()
+    except Exception:
+        pass
+    _conn = None
+
+
+def load(days: int = HISTORY_DAYS) -> List[Tuple[str, float]]:
+    try:
+        with _get_connection().cursor() as cur:
+            cur.execute('''
+                SELECT time_tag, kp FROM kp_history
+                WHERE time_tag >= CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+                ORDER BY time_tag
+            ''', (days,))
+            return [(time_tag.strftime(TIME_FORMAT), float(kp)) for time_tag, kp in cur.fetchall()]
+    except Exception as e:
+        print(f"Kp history read error: {e}")
+        _reset_connection()
+        return []
+
+
+def save(readings: List[Tuple[str, float]]) -> None:
+    """Upsert readings (the newest interval can still be revised) and drop rows older than HISTORY_DAYS"""
+    if not readings:
+        return
+    try:
+        with _get_connection().cursor() as cur:
+            execute_values(cur, '''
+                INSERT INTO kp_history (time_tag, kp) VALUES %s
+                ON CONFLICT (time_tag) DO UPDATE SET kp = EXCLUDED.kp, fetched_at = CURRENT_TIMESTAMP
+            ''', readings)
+            cur.execute("DELETE FROM kp_history WHERE time_tag < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'",
+                        (HISTORY_DAYS,))
+    except Exception as e:
+        print(f"Kp history write error: {e}")
+        _reset_connection()
+
+
+class KpRing:
+    def __init__(self, capacity: int = CAPACITY):
+        self._readings: deque = deque(maxlen=capacity)
+        self.rows_parsed = 0
+
+    def __len__(self) -> int:
+        return len(self._readings)
+
+    @property
+    def last_seen(self) -> str:
+        return self._readings[-1][0] if self._readings else ''
+
+    def extend(self, readings: List[Tuple[str, float]]) -> None:
+        for time_tag, kp in readings:
+            if time_tag > self.last_seen:
+                self._readings.append((time_tag, kp))
+            elif time_tag == self.last_seen:
+                self._readings[-1] = (time_tag, kp)
+
+    def ingest(self, table: List[List]) -> List[Tuple[str, float]]:
+        """New or revised readings from a NOAA product table (header row first, oldest row first),
+        scanned backwards and stopping at the newest reading already held"""
+        last_seen = self.last_seen
+        fresh: List[Tuple[str, float]] = []
+        for row in reversed(table[1:]):
+            if row[0] < last_seen:
+                break
+            self.rows_parsed += 1
+            kp = float(row[1]) if row[1] else 0.0
+            if row[0] == last_seen and kp == self._readings[-1][1]:
+                break
+            fresh.append((row[0], kp))
+        fresh.reverse()
+        self.extend(fresh)
+        return fresh
+
+    def latest(self) -> Optional[Tuple[str, float]]:
+        return self._readings[-1] if self._readings else None
+
+    def since(self, days: int, now: Optional[datetime] = None) -> List[Tuple[str, float]]:
+        cutoff = ((now or datetime.now(timezone.utc)) - timedelta(days=days)).strftime(TIME_FORMAT)
+        return [reading for reading in self._readings if reading[0] >= cutoff]
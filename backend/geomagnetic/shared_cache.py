@@ -0,0 +1,176 @@
+"""
+Shared cross-instance cache of upstream payloads stored in Postgres (upstream_cache table)
+"""
+
+import json
+import os
+import random
+import zlib
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
+
+import psycopg2
+
+GRID_STEP = float(os.environ.get('FORECAST_CACHE_GRID', '0.05'))
+SWEEP_PROBABILITY = float(os.environ.get('UPSTREAM_CACHE_SWEEP_PROBABILITY', '0.05'))
+SWEEP_BATCH = 500
+# Expired rows are kept this long so they can still be served while an upstream is failing
+STALE_IF_ERROR_SECONDS = int(os.environ.get('UPSTREAM_CACHE_STALE_IF_ERROR', '86400'))
+
+_conn = None
+
+
+def snap(lat: float, lon: float, step: float = GRID_STEP):
+    """Snap coordinates to the centre of their grid cell"""
+    return round(round(lat / step) * step, 4), round(round(lon / step) * step, 4)
+
+
+def _get_connection():
+    global _conn
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return None
+    if _conn is None or _conn.closed:
+        _conn = psycopg2.connect(database_url)
+        _conn.autocommit = True
+    return _conn
+
+
+def _reset_connection() -> None:
+    global _conn
+    try:
+        if _conn is not None:
+            _conn.close()
+    except Exception:
+        pass
+    _conn = None
+
+
+def read(provider: str, cell_lat: float, cell_lon: float, variables: str = '') -> Optional[Any]:
+    """Return the cached payload if a non-expired row exists"""
+    try:
+        conn = _get_connection()
+        if conn is None:
+            return None
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT payload FROM upstream_cache
+                WHERE provider = %s AND cell_lat = %s AND cell_lon = %s AND variables = %s
+                  AND expires_at > CURRENT_TIMESTAMP
+            ''', (provider, cell_lat, cell_lon, variables))
+            row = cur.fetchone()
+        if not row:
+            return None
+        return json.loads(zlib.decompress(bytes(row[0])).decode())
+    except Exception as e:
+        print(f"Upstream cache read error: {e}")
+        _reset_connection()
+        return None
+
+
+def read_stale(provider: str, cell_lat: float, cell_lon: float, variables: str = '') -> Optional[Any]:
+    """Return the last stored payload even if it has expired (stale-if-error)"""
+    try:
+        conn = _get_connection()
+        if conn is None:
+            return None
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT payload FROM upstream_cache
+                WHERE provider = %s AND cell_lat = %s AND cell_lon = %s AND variables = %s
+            ''', (provider, cell_lat, cell_lon, variables))
+            row = cur.fetchone()
+        if not row:
+            return None
+        return json.loads(zlib.decompress(bytes(row[0])).decode())
+    except Exception as e:
+        print(f"Upstream cache read error: {e}")
+        _reset_connection()
+        return None
+
+
+def read_many(provider: str, cells: List[Tuple[float, float]], variables: str = '') -> Dict[Tuple[float, float], Any]:
+    """Return cached payloads for several grid cells in one query"""
+    if not cells:
+        return {}
+    try:
+        conn = _get_connection()
+        if conn is None:
+            return {}
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT cell_lat, cell_lon, payload FROM upstream_cache
+                WHERE provider = %s AND variables = %s AND (cell_lat, cell_lon) IN %s
+                  AND expires_at > CURRENT_TIMESTAMP
+            ''', (provider, variables, tuple(cells)))
+            rows = cur.fetchall()
+        return {
+            (float(cell_lat), float(cell_lon)): json.loads(zlib.decompress(bytes(payload)).decode())
+            for cell_lat, cell_lon, payload in rows
+        }
+    except Exception as e:
+        print(f"Upstream cache read error: {e}")
+        _reset_connection()
+        return {}
+
+
+def write(provider: str, cell_lat: float, cell_lon: float, variables: str, payload: Any, ttl: int) -> None:
+    """Store a compressed payload and occasionally sweep expired rows"""
+    try:
+        conn = _get_connection()
+        if conn is None:
+            return
+        compressed = zlib.compress(json.dumps(payload, ensure_ascii=False).encode(), 6)
+        with conn.cursor() as cur:
+            cur.execute('''
+                INSERT INTO upstream_cache (provider, cell_lat, cell_lon, variables, payload, fetched_at, expires_at)
+                VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+                ON CONFLICT (provider, cell_lat, cell_lon, variables)
+                DO UPDATE SET
+                    payload = EXCLUDED.payload,
+                    fetched_at = EXCLUDED.fetched_at,
+                    expires_at = EXCLUDED.expires_at
+            ''', (provider, cell_lat, cell_lon, variables, psycopg2.Binary(compressed), ttl))
+            if random.random() < SWEEP_PROBABILITY:
+                sweep(cur)
+    except Exception as e:
+        print(f"Upstream cache write error: {e}")
+        _reset_connection()
+
+
+def sweep(cur) -> int:
+    """Delete a batch of rows past their stale-if-error window using the expires_at index"""
+    cur.execute('''
+        DELETE FROM upstream_cache
+        WHERE ctid IN (
+            SELECT ctid FROM upstream_cache
+            WHERE expires_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+            LIMIT %s
+        )
+    ''', (STALE_IF_ERROR_SECONDS, SWEEP_BATCH))
+    return cur.rowcount
+
+
+def fetch_through(provider: str, cell_lat: float, cell_lon: float, variables: str,
+                  ttl: Union[int, Callable[[Any], int]], fetch: Callable[[], Any]) -> Any:
+    """Read the shared cache, falling back to the upstream fetch and writing back on a miss;
+    `ttl` may be a function of the fetched payload when its lifetime depends on the contents"""
+    payload = read(provider, cell_lat, cell_lon, variables)
+    if payload is not None:
+        return payload
+    payload = fetch()
+    if payload is not None:
+        write(provider, cell_lat, cell_lon, variables, payload, ttl(payload) if callable(ttl) else ttl)
+    return payload
+
+
+def fetch_or_stale(provider: str, cell_lat: float, cell_lon: float, variables: str,
+                   ttl: Union[int, Callable[[Any], int]], fetch: Callable[[], Any]) -> Tuple[Any, bool]:
+    """fetch_through that falls back to the last stored payload when the upstream fails; returns (payload, stale)"""
+    try:
+        return fetch_through(provider, cell_lat, cell_lon, variables, ttl, fetch), False
+    except Exception as e:
+        payload = read_stale(provider, cell_lat, cell_lon, variables)
+        if payload is None:
+            raise
+        print(f"Serving stale {provider} payload after upstream error: {e}")
+        return payload, True
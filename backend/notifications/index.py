@@ -1,11 +1,35 @@
+import hmac
 import json
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, Any
-import urllib.request
-import urllib.parse
+import time
+from typing import Dict, Any, List, Optional
+
+import email_batch
+import http_client
+from telegram_dispatch import Dispatcher
+
+# One request fans out to at most this many messages (about half a minute at the global rate);
+# larger broadcasts are split by the caller
+MAX_BULK_MESSAGES = int(os.environ.get('TELEGRAM_BULK_MAX', '1000'))
+MAX_BULK_EMAILS = int(os.environ.get('EMAIL_BULK_MAX', '500'))
+
+def bulk_forbidden(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''
+    Массовые рассылки доступны только с X-Bulk-Token, равным BULK_SEND_TOKEN; без настроенного токена они выключены
+    '''
+    token = os.environ.get('BULK_SEND_TOKEN')
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    if token and hmac.compare_digest(headers.get('x-bulk-token', ''), token):
+        return None
+    return {
+        'statusCode': 403,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': 'Forbidden'}),
+        'isBase64Encoded': False
+    }
 
 def check_bot_status() -> Dict[str, Any]:
     bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
@@ -23,39 +47,36 @@ def check_bot_status() -> Dict[str, Any]:
     
     try:
         url = f'https://api.telegram.org/bot{bot_token}/getMe'
-        req = urllib.request.Request(url)
+        result = http_client.get_json(url, timeout=(3, 5))
         
-        with urllib.request.urlopen(req, timeout=5) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            
-            if result.get('ok'):
-                bot_info = result.get('result', {})
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'active': True,
-                        'bot': {
-                            'username': bot_info.get('username'),
-                            'name': bot_info.get('first_name'),
-                            'id': bot_info.get('id')
-                        }
-                    }),
-                    'isBase64Encoded': False
-                }
-            else:
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'active': False, 'reason': 'Invalid token'}),
-                    'isBase64Encoded': False
-                }
+        if result.get('ok'):
+            bot_info = result.get('result', {})
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'active': True,
+                    'bot': {
+                        'username': bot_info.get('username'),
+                        'name': bot_info.get('first_name'),
+                        'id': bot_info.get('id')
+                    }
+                }),
+                'isBase64Encoded': False
+            }
+        else:
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'active': False, 'reason': 'Invalid token'}),
+                'isBase64Encoded': False
+            }
     except Exception as e:
         return {
             'statusCode': 200,
@@ -70,12 +91,14 @@ def check_bot_status() -> Dict[str, Any]:
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Отправка уведомлений о погоде и пыльце через Email и Telegram, проверка статуса бота
-    Args: event - dict с httpMethod, body (email, telegram, message, type), pathParams
+    Args: event - dict с httpMethod, body (email, telegram, message, type), pathParams;
+          POST ?action=bulk-telegram с body {messages: [{telegram, message}]} и заголовком X-Bulk-Token для массовой рассылки,
+          POST ?action=bulk-email с body {messages: [{email, message, type}]} и X-Bulk-Token через одну SMTP-сессию
           context - object с request_id
     Returns: HTTP response dict
     '''
     method: str = event.get('httpMethod', 'POST')
-    query_params = event.get('queryStringParameters', {})
+    query_params = event.get('queryStringParameters') or {}
     
     if method == 'OPTIONS':
         return {
@@ -93,6 +116,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     if method == 'GET' and query_params.get('action') == 'bot-status':
         return check_bot_status()
     
+    if method == 'POST' and query_params.get('action') == 'bulk-telegram':
+        # One request reaches up to MAX_BULK_MESSAGES chats, so it must not be open to anyone
+        forbidden = bulk_forbidden(event)
+        if forbidden:
+            return forbidden
+        return send_telegram_bulk(json.loads(event.get('body') or '{}'), context)
+    
+    if method == 'POST' and query_params.get('action') == 'bulk-email':
+        forbidden = bulk_forbidden(event)
+        if forbidden:
+            return forbidden
+        return send_email_bulk(json.loads(event.get('body') or '{}'), context)
+    
     if method != 'POST':
         return {
             'statusCode': 405,
@@ -143,69 +179,150 @@ def send_email(to_email: str, message: str, notification_type: str) -> Dict[str,
         print('SMTP credentials not configured')
         return {'success': False, 'error': 'SMTP credentials not configured'}
     
-    subject_map = {
-        'pollen_high': '⚠️ Высокий уровень пыльцы!',
-        'pollen_medium': '⚡ Средний уровень пыльцы',
-        'weather_alert': '🌪️ Погодное предупреждение',
-        'daily_forecast': '🌤️ Ежедневный прогноз погоды'
-    }
-    
-    subject = subject_map.get(notification_type, '🐺 Уведомление от Волк-синоптик')
-    
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = smtp_email
-    msg['To'] = to_email
-    
-    html = f'''
-    <html>
-        <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f5f5f5;">
-            <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-                <h2 style="color: #4A90E2; margin-bottom: 20px;">🐺 Волк-синоптик</h2>
-                <div style="background: linear-gradient(135deg, #4A90E2, #98D8C8); padding: 20px; border-radius: 8px; color: white; margin-bottom: 20px;">
-                    <p style="margin: 0; font-size: 16px; line-height: 1.6;">{message}</p>
-                </div>
-                <p style="color: #666; font-size: 14px;">
-                    Это автоматическое уведомление от вашего погодного сервиса Волк-синоптик.
-                </p>
-            </div>
-        </body>
-    </html>
+    outcome = email_batch.send_batch(smtp_email, smtp_password, [(to_email, message, notification_type)])[0]
+    if outcome['success']:
+        print(f'Email sent successfully to {to_email}')
+        return {'success': True}
+    print(f'Email error: {outcome["error"]}')
+    return {'success': False, 'error': outcome['error']}
+
+def send_email_bulk(body_data: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Рассылка писем через одну SMTP-сессию: body {'messages': [{'email', 'message', 'type'}, ...]},
+    результат по каждому письму в исходном порядке
     '''
+    smtp_email = os.environ.get('SMTP_EMAIL')
+    smtp_password = os.environ.get('SMTP_PASSWORD')
+    messages = body_data.get('messages')
+    
+    error = None
+    if not smtp_email or not smtp_password:
+        error = 'SMTP credentials not configured'
+    elif not isinstance(messages, list) or not all(isinstance(item, dict) for item in messages):
+        error = 'messages must be a list of {email, message, type} objects'
+    elif len(messages) > MAX_BULK_EMAILS:
+        error = f'Too many messages, maximum is {MAX_BULK_EMAILS}'
+    if error:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'success': False, 'error': error}),
+            'isBase64Encoded': False
+        }
     
-    msg.attach(MIMEText(html, 'html'))
+    started = time.time()
+    session = email_batch.get_session(smtp_email, smtp_password)
+    connects_before = session.connects
+    outcomes = email_batch.send_batch(smtp_email, smtp_password, [
+        (str(item.get('email', '')), str(item.get('message', '')), item.get('type', 'info')) for item in messages
+    ])
+    elapsed = time.time() - started
+    sent = sum(1 for outcome in outcomes if outcome['success'])
+    print(f'Email bulk: {sent}/{len(outcomes)} sent, {session.connects - connects_before} connections, {elapsed:.1f} s')
     
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(smtp_email, smtp_password)
-            server.send_message(msg)
-        print(f'Email sent successfully to {to_email}')
-        return {'success': True}
-    except Exception as e:
-        print(f'Email error: {str(e)}')
-        return {'success': False, 'error': str(e)}
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({
+            'success': True,
+            'sent': sent,
+            'failed': len(outcomes) - sent,
+            'connections': session.connects - connects_before,
+            'durationMs': round(elapsed * 1000),
+            'messagesPerSecond': round(sent / elapsed, 1) if elapsed > 0 else None,
+            'results': outcomes,
+            'request_id': context.request_id
+        }),
+        'isBase64Encoded': False
+    }
 
-def get_chat_id_from_username(bot_token: str, username: str) -> str:
-    username = username.lstrip('@')
+def get_chat_ids_from_usernames(bot_token: str, usernames: List[str]) -> Dict[str, str]:
+    """Chat ids of users who have written to the bot, from a single getUpdates call; unknown names map to themselves"""
+    wanted = {username.lstrip('@').lower(): username for username in usernames}
+    chat_ids = {username: username for username in usernames}
     
     try:
         url = f'https://api.telegram.org/bot{bot_token}/getUpdates'
-        req = urllib.request.Request(url)
+        result = http_client.get_json(url)
         
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            
-            if result.get('ok'):
-                for update in result.get('result', []):
-                    message = update.get('message', {})
-                    from_user = message.get('from', {})
-                    
-                    if from_user.get('username', '').lower() == username.lower():
-                        return str(from_user.get('id'))
+        if result.get('ok'):
+            for update in result.get('result', []):
+                message = update.get('message', {})
+                from_user = message.get('from', {})
+                
+                original = wanted.get(from_user.get('username', '').lower())
+                if original is not None:
+                    chat_ids[original] = str(from_user.get('id'))
         
-        return username
+        return chat_ids
     except:
-        return username
+        return chat_ids
+
+def get_chat_id_from_username(bot_token: str, username: str) -> str:
+    return get_chat_ids_from_usernames(bot_token, [username])[username]
+
+def send_telegram_bulk(body_data: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Рассылка многим получателям: body {'messages': [{'telegram': chat_id или @username, 'message': текст}, ...]},
+    результат по каждому сообщению в исходном порядке
+    '''
+    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
+    messages = body_data.get('messages')
+    
+    error = None
+    if not bot_token:
+        error = 'Telegram bot token not configured'
+    elif not isinstance(messages, list) or not all(isinstance(item, dict) for item in messages):
+        error = 'messages must be a list of {telegram, message} objects'
+    elif len(messages) > MAX_BULK_MESSAGES:
+        error = f'Too many messages, maximum is {MAX_BULK_MESSAGES}'
+    if error:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'success': False, 'error': error}),
+            'isBase64Encoded': False
+        }
+    
+    recipients = [str(item.get('telegram', '')) for item in messages]
+    usernames = sorted({recipient for recipient in recipients if recipient and not recipient.lstrip('-').isdigit()})
+    chat_ids = get_chat_ids_from_usernames(bot_token, usernames) if usernames else {}
+    
+    started = time.time()
+    dispatcher = Dispatcher(bot_token)
+    outcomes = dispatcher.dispatch([
+        (chat_ids.get(recipient, recipient), f'🐺 *Волк-синоптик*\n\n{item.get("message", "")}')
+        for recipient, item in zip(recipients, messages)
+    ])
+    sent = sum(1 for outcome in outcomes if outcome['success'])
+    print(f'Telegram bulk: {sent}/{len(outcomes)} sent, {dispatcher.throttled} throttled, {time.time() - started:.1f} s')
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({
+            'success': True,
+            'sent': sent,
+            'failed': len(outcomes) - sent,
+            'throttled': dispatcher.throttled,
+            'durationMs': round((time.time() - started) * 1000),
+            'results': outcomes,
+            'request_id': context.request_id
+        }),
+        'isBase64Encoded': False
+    }
 
 def send_telegram(telegram_input: str, message: str) -> Dict[str, Any]:
     bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
@@ -229,19 +346,12 @@ def send_telegram(telegram_input: str, message: str) -> Dict[str, Any]:
     }
     
     try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            if result.get('ok'):
-                print(f'Telegram sent successfully to {chat_id}')
-            else:
-                print(f'Telegram error: {result}')
-            return {'success': result.get('ok', False), 'chat_id': chat_id}
+        result = http_client.post_json(url, data)
+        if result.get('ok'):
+            print(f'Telegram sent successfully to {chat_id}')
+        else:
+            print(f'Telegram error: {result}')
+        return {'success': result.get('ok', False), 'chat_id': chat_id}
     except Exception as e:
         print(f'Telegram exception: {str(e)}')
         return {'success': False, 'error': str(e)}
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Bulk Telegram delivery under the Bot API limits: a global token bucket (~30 messages/s per bot) and
+per-chat pacing (1 message/s, 20/min for groups), a bounded worker pool with each chat's messages sent
+in order by one worker, retry_after from 429 responses honoured, and one outcome per message.
+Only 429s, 5xx responses and requests that failed before being written are sent again.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import http_client
+
+TELEGRAM_API_BASE = os.environ.get('TELEGRAM_API_BASE', 'https://api.telegram.org')
+# Just under the ~30/s Telegram allows, so jitter in the send times does not cross its sliding window
+GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', '28'))
+CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', '1'))
+GROUP_RATE = 20 / 60
+WORKERS = int(os.environ.get('TELEGRAM_WORKERS', '16'))
+MAX_ATTEMPTS = 5
+# 429s with a longer retry_after than this are reported instead of waited out
+MAX_RETRY_AFTER = 30
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations: the caller sleeps for the returned delay, so waiting
+    happens outside the lock and concurrent callers queue up in arrival order"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Hand out nothing for the next `seconds`; concurrent pauses overlap rather than add up"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def take(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ChatPacer:
+    """Spacing for one chat, whose messages are sent one after another by a single worker; measured
+    from the actual send so a wait for the global bucket cannot squeeze two sends together"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_at = 0.0
+
+    def wait(self) -> None:
+        delay = self.next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def sent(self) -> None:
+        self.next_at = time.monotonic() + self.interval
+
+    def pause(self, seconds: float) -> None:
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+
+def _retry_after(error: urllib.error.HTTPError) -> Optional[float]:
+    try:
+        payload = json.loads(error.read() or b'{}')
+    except ValueError:
+        return None
+    value = (payload.get('parameters') or {}).get('retry_after')
+    return float(value) if value is not None else None
+
+
+class Dispatcher:
+    def __init__(self, bot_token: str, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE,
+                 workers: int = WORKERS):
+        self.url = f'{TELEGRAM_API_BASE}/bot{bot_token}/sendMessage'
+        # No burst allowance: Telegram counts over a sliding second, so a full bucket would double it
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.chat_rate = chat_rate
+        self.workers = workers
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _send(self, chat_id: str, text: str, pacer: ChatPacer) -> Dict[str, Any]:
+        outcome: Dict[str, Any] = {'chat_id': chat_id, 'success': False, 'attempts': 0}
+        for attempt in range(MAX_ATTEMPTS):
+            pacer.wait()
+            self.global_bucket.take()
+            pacer.sent()
+            outcome['attempts'] = attempt + 1
+            try:
+                result = http_client.post_json(self.url, {'chat_id': chat_id, 'text': text, 'parse_mode': 'Markdown'},
+                                               retries=0)
+            except urllib.error.HTTPError as e:
+                if e.code == 429:
+                    retry_after = _retry_after(e) or 1.0
+                    with self._lock:
+                        self.throttled += 1
+                    if retry_after > MAX_RETRY_AFTER:
+                        outcome['error'] = f'Throttled, retry after {retry_after:.0f} s'
+                        return outcome
+                    # Chats are already paced, so a 429 means the bot as a whole is over its limit
+                    pacer.pause(retry_after)
+                    self.global_bucket.pause(retry_after)
+                    continue
+                if e.code >= 500:
+                    time.sleep(random.uniform(0, min(2.0, 0.2 * 2 ** attempt)))
+                    continue
+                # 400 (bad chat id or markup), 403 (bot blocked by the user): retrying cannot help
+                outcome['error'] = f'HTTP {e.code}: {e.reason}'
+                return outcome
+            except Exception as e:
+                if getattr(e, 'request_written', True):
+                    # Timed out or dropped after the request was written: Telegram may have sent the
+                    # message, and sending it again could deliver it twice
+                    outcome['error'] = f'Delivery unknown: {e}'
+                    return outcome
+                # Failed before the request left (connect error), so it is safe to send again
+                outcome['error'] = str(e)
+                time.sleep(random.uniform(0, min(2.0, 0.2 * 2 ** attempt)))
+                continue
+            outcome['success'] = bool(result.get('ok'))
+            outcome.pop('error', None)
+            if outcome['success']:
+                outcome['message_id'] = (result.get('result') or {}).get('message_id')
+            else:
+                outcome['error'] = result.get('description', 'Not sent')
+            return outcome
+        outcome.setdefault('error', 'Too many attempts')
+        return outcome
+
+    def _send_chat(self, chat_id: str, items: List[Tuple[int, str]],
+                   outcomes: List[Optional[Dict[str, Any]]]) -> None:
+        pacer = ChatPacer(GROUP_RATE if chat_id.startswith('-') else self.chat_rate)
+        for position, text in items:
+            outcomes[position] = self._send(chat_id, text, pacer)
+
+    def dispatch(self, messages: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Send (chat_id, text) pairs; returns one outcome per pair in input order"""
+        by_chat: Dict[str, List[Tuple[int, str]]] = {}
+        for position, (chat_id, text) in enumerate(messages):
+            by_chat.setdefault(str(chat_id), []).append((position, text))
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(by_chat)))) as pool:
+            for future in [pool.submit(self._send_chat, chat_id, items, outcomes) for chat_id, items in by_chat.items()]:
+                future.result()
+        return outcomes
@@ -0,0 +1,222 @@
+"""
+Pooled keep-alive HTTPS client: per-host connections persist across warm invocations,
+each upstream gets its own connect/read timeouts, failures are retried a bounded number
+of times with jittered backoff, and JSON is decoded straight from the response bytes
+"""
+
+import gzip
+import http.client
+import io
+import json
+import os
+import random
+import select
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+from typing import Dict, Any, List, Optional, Tuple
+
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '8'))
+DEFAULT_TIMEOUT = (
+    float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3')),
+    float(os.environ.get('HTTP_READ_TIMEOUT', '10'))
+)
+
+# (connect, read) seconds per upstream host
+UPSTREAM_TIMEOUTS = {
+    'api.open-meteo.com': (3, 10),
+    'historical-forecast-api.open-meteo.com': (3, 20),
+    'air-quality-api.open-meteo.com': (3, 10),
+    'geocoding-api.open-meteo.com': (2, 5),
+    'api.openweathermap.org': (3, 8),
+    'services.swpc.noaa.gov': (3, 10),
+    'api.telegram.org': (3, 10)
+}
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 2.0
+
+_ssl_context = ssl.create_default_context()
+
+
+class _HostPool:
+    """Idle keep-alive connections to one host plus reuse counters"""
+
+    def __init__(self):
+        self.idle: List[http.client.HTTPConnection] = []
+        self.requests = 0
+        self.opened = 0
+        self.reused = 0
+        self.retries = 0
+        self.errors = 0
+
+
+_pools: Dict[Tuple[str, str, int], _HostPool] = {}
+_lock = threading.Lock()
+
+
+def _pool(key: Tuple[str, str, int]) -> _HostPool:
+    with _lock:
+        if key not in _pools:
+            _pools[key] = _HostPool()
+        return _pools[key]
+
+
+def _acquire(key: Tuple[str, str, int], timeout: Tuple[float, float]) -> Tuple[http.client.HTTPConnection, bool]:
+    """Return (connection, reused): an idle pooled connection or a freshly opened one"""
+    pool = _pool(key)
+    while True:
+        with _lock:
+            conn = pool.idle.pop() if pool.idle else None
+        if conn is None:
+            break
+        # An idle socket that is readable has been closed by the server (or holds stray data): drop it
+        # here rather than find out after writing a request that must not be sent twice
+        if select.select([conn.sock], [], [], 0)[0]:
+            conn.close()
+            continue
+        with _lock:
+            pool.reused += 1
+        conn.sock.settimeout(timeout[1])
+        return conn, True
+    with _lock:
+        pool.opened += 1
+
+    scheme, host, port = key
+    if scheme == 'https':
+        conn = http.client.HTTPSConnection(host, port, timeout=timeout[0], context=_ssl_context)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout[0])
+    conn.connect()
+    conn.sock.settimeout(timeout[1])
+    return conn, False
+
+
+def _release(key: Tuple[str, str, int], conn: http.client.HTTPConnection, reusable: bool) -> None:
+    pool = _pool(key)
+    with _lock:
+        if reusable and len(pool.idle) < POOL_SIZE:
+            pool.idle.append(conn)
+            return
+    conn.close()
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it is short enough"""
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def request(method: str, url: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None,
+            timeout: Optional[Tuple[float, float]] = None, retries: Optional[int] = None) -> Tuple[int, Dict[str, str], bytes]:
+    """Send a request over a pooled connection; returns (status, headers, body) for 2xx responses.
+
+    Non-2xx responses raise urllib.error.HTTPError so existing handlers keep working.
+    GET is retried twice by default; other methods are not retried unless `retries` is given,
+    except when a reused keep-alive connection turns out to have been closed by the server: that is
+    retried for idempotent methods, and for others only if the request was not fully written.
+    A transport error that is finally raised carries `request_written`, so a caller that retries on
+    its own can tell a request that never left from one whose outcome is unknown.
+    """
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    port = parts.port or (443 if scheme == 'https' else 80)
+    key = (scheme, parts.hostname, port)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    timeout = timeout or UPSTREAM_TIMEOUTS.get(parts.hostname, DEFAULT_TIMEOUT)
+    retries = (2 if method == 'GET' else 0) if retries is None else retries
+    send_headers = {'Accept-Encoding': 'gzip', 'Connection': 'keep-alive', **(headers or {})}
+    pool = _pool(key)
+
+    attempt = 0
+    while True:
+        with _lock:
+            pool.requests += 1
+        reused = False
+        written = False
+        try:
+            conn, reused = _acquire(key, timeout)
+            try:
+                conn.request(method, path, body=body, headers=send_headers)
+                written = True
+                response = conn.getresponse()
+                data = response.read()
+            except Exception:
+                conn.close()
+                raise
+            _release(key, conn, not response.will_close)
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+            # A reused connection the server has already dropped is not a real failure, but once the
+            # request is written the server may have acted on it, so a POST is not sent a second time
+            if reused and (not written or method in IDEMPOTENT_METHODS):
+                continue
+            error = e
+        except (OSError, http.client.HTTPException) as e:
+            error = e
+        else:
+            if response.getheader('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+            response_headers = {name: value for name, value in response.getheaders()}
+            if 200 <= response.status < 300:
+                return response.status, response_headers, data
+            if response.status in RETRY_STATUSES and attempt < retries:
+                with _lock:
+                    pool.retries += 1
+                time.sleep(_backoff(attempt, response.getheader('Retry-After')))
+                attempt += 1
+                continue
+            with _lock:
+                pool.errors += 1
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.msg, io.BytesIO(data))
+
+        if attempt >= retries:
+            with _lock:
+                pool.errors += 1
+            error.request_written = written
+            raise error
+        with _lock:
+            pool.retries += 1
+        time.sleep(_backoff(attempt))
+        attempt += 1
+
+
+def get_json(url: str, headers: Optional[Dict[str, str]] = None,
+             timeout: Optional[Tuple[float, float]] = None, retries: Optional[int] = None) -> Any:
+    _, _, data = request('GET', url, headers=headers, timeout=timeout, retries=retries)
+    return json.loads(data)
+
+
+def post_json(url: str, payload: Any, headers: Optional[Dict[str, str]] = None,
+              timeout: Optional[Tuple[float, float]] = None, retries: Optional[int] = None) -> Any:
+    body = json.dumps(payload).encode('utf-8')
+    _, _, data = request('POST', url, body=body, headers={'Content-Type': 'application/json', **(headers or {})},
+                         timeout=timeout, retries=retries)
+    return json.loads(data)
+
+
+def stats() -> Dict[str, Any]:
+    """Per-host request, connection and reuse counters"""
+    with _lock:
+        result = {}
+        for (scheme, host, port), pool in _pools.items():
+            connections = pool.opened + pool.reused
+            result[host] = {
+                'requests': pool.requests,
+                'connectionsOpened': pool.opened,
+                'connectionsReused': pool.reused,
+                'reuseRatio': round(pool.reused / connections, 3) if connections else None,
+                'idle': len(pool.idle),
+                'retries': pool.retries,
+                'errors': pool.errors
+            }
+        return result
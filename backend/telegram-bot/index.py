@@ -1,7 +1,9 @@
 import json
 import os
 from typing import Dict, Any
-import urllib.request
+import urllib.error
+
+import http_client
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -174,21 +176,18 @@ def get_webhook_info() -> Dict[str, Any]:
     url = f'https://api.telegram.org/bot{bot_token}/getWebhookInfo'
     
     try:
-        req = urllib.request.Request(url)
+        result = http_client.get_json(url)
+        print(f'Webhook info: {result}')
         
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            print(f'Webhook info: {result}')
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(result),
-                'isBase64Encoded': False
-            }
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
     except Exception as e:
         print(f'Get webhook info error: {str(e)}')
         return {
@@ -227,29 +226,22 @@ def setup_webhook() -> Dict[str, Any]:
     }
     
     try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
+        result = http_client.post_json(url, data)
+        print(f'Webhook setup result: {result}')
         
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            print(f'Webhook setup result: {result}')
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': result.get('ok', False),
-                    'webhook_url': webhook_url,
-                    'result': result
-                }),
-                'isBase64Encoded': False
-            }
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'success': result.get('ok', False),
+                'webhook_url': webhook_url,
+                'result': result
+            }),
+            'isBase64Encoded': False
+        }
     except Exception as e:
         print(f'Webhook setup error: {str(e)}')
         return {
@@ -281,16 +273,9 @@ def send_message(chat_id: int, text: str) -> bool:
     print(f'Data: {json.dumps(data, ensure_ascii=False)}')
     
     try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            print(f'Send message result: {result}')
-            return result.get('ok', False)
+        result = http_client.post_json(url, data)
+        print(f'Send message result: {result}')
+        return result.get('ok', False)
     except urllib.error.HTTPError as e:
         error_body = e.read().decode('utf-8')
         print(f'Telegram API error {e.code}: {error_body}')
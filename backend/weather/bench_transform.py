@@ -0,0 +1,95 @@
+"""
+Microbenchmark: per-row Open-Meteo transform loops vs the column stage for the 24h/10d/7d windows
+Run: python bench_transform.py
+"""
+
+import json
+import random
+import timeit
+from datetime import datetime
+
+import columns
+import index
+
+HOURLY_VARS = ['temperature_2m', 'precipitation_probability', 'weather_code', 'precipitation', 'rain', 'snowfall', 'pressure_msl']
+DAILY_VARS = ['weather_code', 'temperature_2m_max', 'temperature_2m_min', 'precipitation_probability_max',
+              'precipitation_sum', 'rain_sum', 'snowfall_sum', 'pressure_msl_max', 'pressure_msl_min']
+
+
+def sample_payload():
+    random.seed(42)
+    hours = [f"2026-10-{1 + h // 24:02d}T{h % 24:02d}:00" for h in range(21 * 24)]
+    days = [f"2026-10-{1 + d:02d}" for d in range(21)]
+    hourly = {'time': hours}
+    for name in HOURLY_VARS:
+        hourly[name] = [random.choice([0, 3, 61, 71]) if name == 'weather_code' else round(random.uniform(0, 30), 2) for _ in hours]
+    daily = {'time': days}
+    for name in DAILY_VARS:
+        daily[name] = [random.choice([0, 3, 61, 71]) if name == 'weather_code' else round(random.uniform(0, 30), 2) for _ in days]
+    return hourly, daily
+
+
+def legacy_hourly(hourly):
+    result = []
+    hourly_times = hourly.get('time', [])
+    for i in range(min(24, len(hourly_times))):
+        weather_code = hourly.get('weather_code', [])[i] if i < len(hourly.get('weather_code', [])) else 0
+        result.append({
+            'time': datetime.fromisoformat(hourly_times[i]).strftime('%H:%M'),
+            'temp': round(hourly.get('temperature_2m', [])[i]) if i < len(hourly.get('temperature_2m', [])) else 0,
+            'icon': index.WEATHER_ICONS.get(weather_code, 'Cloud'),
+            'precip': hourly.get('precipitation_probability', [])[i] if i < len(hourly.get('precipitation_probability', [])) else 0,
+            'rain': round(hourly.get('rain', [])[i], 1) if i < len(hourly.get('rain', [])) else 0,
+            'snow': round(hourly.get('snowfall', [])[i], 1) if i < len(hourly.get('snowfall', [])) else 0,
+            'precipitation': round(hourly.get('precipitation', [])[i], 1) if i < len(hourly.get('precipitation', [])) else 0,
+            'pressure': round(hourly.get('pressure_msl', [])[i]) if i < len(hourly.get('pressure_msl', [])) else 0
+        })
+    return result
+
+
+def legacy_daily_rows(daily, start, end, first_key):
+    result = []
+    for i in range(start, end):
+        weather_code = daily.get('weather_code', [])[i] if i < len(daily.get('weather_code', [])) else 0
+        row = {first_key: index.DAY_LABELS[i - start] if first_key == 'day' else daily['time'][i]}
+        row.update({
+            'high': round(daily.get('temperature_2m_max', [])[i]) if i < len(daily.get('temperature_2m_max', [])) else 0,
+            'low': round(daily.get('temperature_2m_min', [])[i]) if i < len(daily.get('temperature_2m_min', [])) else 0,
+            'icon': index.WEATHER_ICONS.get(weather_code, 'Cloud')
+        })
+        if first_key == 'day':
+            row['precip'] = daily.get('precipitation_probability_max', [])[i] if i < len(daily.get('precipitation_probability_max', [])) else 0
+        row.update({
+            'precipitation': round(daily.get('precipitation_sum', [])[i], 1) if i < len(daily.get('precipitation_sum', [])) else 0,
+            'rain': round(daily.get('rain_sum', [])[i], 1) if i < len(daily.get('rain_sum', [])) else 0,
+            'snow': round(daily.get('snowfall_sum', [])[i], 1) if i < len(daily.get('snowfall_sum', [])) else 0,
+            'condition': index.WEATHER_CODES.get(weather_code, 'Неизвестно'),
+            'pressureMax': round(daily.get('pressure_msl_max', [])[i]) if i < len(daily.get('pressure_msl_max', [])) else 0,
+            'pressureMin': round(daily.get('pressure_msl_min', [])[i]) if i < len(daily.get('pressure_msl_min', [])) else 0
+        })
+        result.append(row)
+    return result
+
+
+def bench(label, legacy, column_stage, number=5000):
+    assert json.dumps(legacy(), ensure_ascii=False) == json.dumps(column_stage(), ensure_ascii=False)
+    # Interleaved so drift on a shared machine hits both sides alike
+    legacy_runs, column_runs = [], []
+    for _ in range(7):
+        legacy_runs.append(timeit.timeit(legacy, number=number))
+        column_runs.append(timeit.timeit(column_stage, number=number))
+    legacy_us = min(legacy_runs) / number * 1e6
+    column_us = min(column_runs) / number * 1e6
+    print(f"{label:<12} legacy {legacy_us:8.1f} us   columns {column_us:8.1f} us   speedup x{legacy_us / column_us:.2f}")
+
+
+def main():
+    hourly, daily = sample_payload()
+    print(f"numpy: {'yes' if columns.np is not None else 'no'} (columns shorter than {columns.NUMPY_MIN_LENGTH} stay in Python)")
+    bench('hourly 24h', lambda: legacy_hourly(hourly), lambda: index.build_hourly(hourly, 0, 24))
+    bench('daily 10d', lambda: legacy_daily_rows(daily, 7, 17, 'day'), lambda: index.build_daily(daily, 7, 17))
+    bench('history 7d', lambda: legacy_daily_rows(daily, 4, 11, 'date'), lambda: index.build_history(daily, 4, 11))
+
+
+if __name__ == '__main__':
+    main()
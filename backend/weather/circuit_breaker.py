@@ -0,0 +1,128 @@
+"""
+Per-upstream circuit breakers: a rolling window of call outcomes (errors and slow calls) opens
+the circuit so callers fail fast; after a cool-down a single half-open probe decides whether to close it
+"""
+
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+from collections import deque
+from typing import Dict, Any, Callable
+
+WINDOW = int(os.environ.get('CIRCUIT_WINDOW', '20'))
+MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', '5'))
+FAILURE_RATE = float(os.environ.get('CIRCUIT_FAILURE_RATE', '0.5'))
+SLOW_CALL_MS = float(os.environ.get('CIRCUIT_SLOW_CALL_MS', '5000'))
+OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '30'))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+def _is_failure(error: Exception) -> bool:
+    # Client errors mean the upstream is up and answering; they must not open the circuit
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code == 429
+    return True
+
+
+class CircuitBreaker:
+    """closed -> open when the failure rate over the window reaches the threshold,
+    open -> half-open after OPEN_SECONDS, half-open -> closed on a successful probe"""
+
+    def __init__(self, name: str, window: int = WINDOW, min_calls: int = MIN_CALLS,
+                 failure_rate: float = FAILURE_RATE, slow_call_ms: float = SLOW_CALL_MS,
+                 open_seconds: float = OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_ms = slow_call_ms
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def _allow(self) -> bool:
+        with self._lock:
+            if self.state == 'open' and time.time() - self._opened_at >= self.open_seconds:
+                self.state = 'half_open'
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def _record(self, ok: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            if self.state == 'half_open':
+                self._probing = False
+                if ok:
+                    self.state = 'closed'
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if (self.state == 'closed' and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def _open(self) -> None:
+        self.state = 'open'
+        self._opened_at = time.time()
+        self.opened += 1
+        print(f"Circuit for {self.name} opened")
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        if not self._allow():
+            raise CircuitOpenError(f'{self.name} circuit is open')
+        started = time.perf_counter()
+        try:
+            value = fn()
+        except Exception as e:
+            self._record(not _is_failure(e))
+            raise
+        self._record((time.perf_counter() - started) * 1000 < self.slow_call_ms)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'calls': self.calls,
+                'rejected': self.rejected,
+                'opened': self.opened,
+                'windowFailures': self._outcomes.count(False),
+                'windowCalls': len(self._outcomes)
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def for_url(url: str) -> CircuitBreaker:
+    """Breaker for the URL's host"""
+    host = urllib.parse.urlsplit(url).hostname or ''
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def stats() -> Dict[str, Any]:
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
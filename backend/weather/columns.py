@@ -0,0 +1,57 @@
+"""
+Column-oriented transforms for Open-Meteo hourly/daily arrays: each variable is resolved once,
+padded or trimmed to the window length and rounded or mapped in bulk (NumPy when installed)
+"""
+
+from datetime import datetime
+from typing import Dict, Any, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Below this length array conversion costs more than it saves, so short windows stay in Python
+NUMPY_MIN_LENGTH = 64
+
+
+def window(block: Dict[str, Any], name: str, start: int, end: int, default: Any = 0) -> List[Any]:
+    """Slice [start, end) of a variable array, padding missing tail values with default"""
+    values = block.get(name) or []
+    column = values[start:end]
+    if len(values) < end:
+        column.extend([default] * ((end - start) - len(column)))
+    return column
+
+
+def round_int(column: List[Any]) -> List[Any]:
+    """round(v) over a column; NumPy rint matches Python's round-half-even for whole numbers"""
+    if len(column) >= NUMPY_MIN_LENGTH and np is not None:
+        try:
+            array = np.asarray(column, dtype=np.float64)
+        except (TypeError, ValueError):
+            array = None
+        if array is not None and not np.isnan(array).any():
+            return np.rint(array).astype(np.int64).tolist()
+    return list(map(round, column))
+
+
+def round_1(column: List[Any]) -> List[Any]:
+    """round(v, 1) over a column; kept in Python since NumPy's scaled rounding differs on ties like 0.15"""
+    return [round(v, 1) for v in column]
+
+
+def hour_labels(times: List[str]) -> List[str]:
+    """'HH:MM' labels, slicing ISO 'YYYY-MM-DDTHH:MM' strings directly instead of parsing them"""
+    return [t[11:16] if len(t) == 16 and t[10] == 'T' else datetime.fromisoformat(t).strftime('%H:%M') for t in times]
+
+
+def map_codes(codes: List[Any], table: Dict[Any, str], default: str) -> List[str]:
+    lookup = table.get
+    return [lookup(code, default) for code in codes]
+
+
+def rows(fields: Sequence[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+    """Zip named columns into row dicts, preserving field order"""
+    names = [name for name, _ in fields]
+    return [dict(zip(names, values)) for values in zip(*(column for _, column in fields))]
@@ -0,0 +1,140 @@
+"""
+In-process LRU cache for upstream forecasts keyed by a snapped lat/lon grid cell
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+
+GRID_STEP = float(os.environ.get('FORECAST_CACHE_GRID', '0.05'))
+TTL_SECONDS = int(os.environ.get('FORECAST_CACHE_TTL', '600'))
+STALE_SECONDS = int(os.environ.get('FORECAST_CACHE_STALE', '3600'))
+STALE_IF_ERROR_SECONDS = int(os.environ.get('FORECAST_CACHE_STALE_IF_ERROR', '86400'))
+MAX_ENTRIES = int(os.environ.get('FORECAST_CACHE_MAX_ENTRIES', '512'))
+
+
+def snap(lat: float, lon: float, step: float = GRID_STEP) -> Tuple[float, float]:
+    """Snap coordinates to the centre of their grid cell"""
+    return round(round(lat / step) * step, 4), round(round(lon / step) * step, 4)
+
+
+class ForecastCache:
+    """LRU cache with TTL, max-entry bound, stale-while-revalidate and stale-if-error retention"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: int = TTL_SECONDS,
+                 stale: int = STALE_SECONDS, grid_step: float = GRID_STEP,
+                 stale_if_error: int = STALE_IF_ERROR_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale = stale
+        self.stale_if_error = stale_if_error
+        self.grid_step = grid_step
+        self._entries: 'OrderedDict[Tuple, Tuple[float, Any]]' = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+        self.stale_if_error_hits = 0
+
+    def key(self, provider: str, lat: float, lon: float, variant: str = '') -> Tuple:
+        cell_lat, cell_lon = snap(lat, lon, self.grid_step)
+        return (provider, cell_lat, cell_lon, variant)
+
+    def get(self, key: Tuple) -> Tuple[Optional[Any], str]:
+        """Return (value, state) where state is 'fresh', 'stale' or 'miss'"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, 'miss'
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age > self.ttl + self.stale:
+                # Entries past the stale window are kept only as a last resort for upstream outages
+                if age > self.ttl + self.stale + self.stale_if_error:
+                    del self._entries[key]
+                return None, 'miss'
+            self._entries.move_to_end(key)
+            return value, 'fresh' if age <= self.ttl else 'stale'
+
+    def last_good(self, key: Tuple) -> Optional[Any]:
+        """Any retained value for the key regardless of age, for serving while the upstream is failing"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl + self.stale + self.stale_if_error:
+                return None
+            self.stale_if_error_hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, value: Any, stored_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at if stored_at is not None else time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record(self, state: str) -> None:
+        """Count a lookup by its get() state; counters are shared with the refresh threads"""
+        with self._lock:
+            if state == 'fresh':
+                self.hits += 1
+            elif state == 'stale':
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+
+    def get_or_fetch(self, key: Tuple, fetch: Callable[[], Any]) -> Tuple[Any, str]:
+        """Serve from cache, refreshing stale entries in the background"""
+        value, state = self.get(key)
+        self.record(state)
+        if state == 'fresh':
+            return value, 'HIT'
+        if state == 'stale':
+            self._refresh_async(key, fetch)
+            return value, 'STALE'
+        value = fetch()
+        if value is not None:
+            self.put(key, value)
+        return value, 'MISS'
+
+    def _refresh_async(self, key: Tuple, fetch: Callable[[], Any]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = fetch()
+                if value is not None:
+                    self.put(key, value)
+            except Exception as e:
+                with self._lock:
+                    self.refresh_errors += 1
+                print(f"Forecast cache refresh error for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'maxEntries': self.max_entries,
+            'ttl': self.ttl,
+            'stale': self.stale,
+            'staleIfError': self.stale_if_error,
+            'gridStep': self.grid_step,
+            'hits': self.hits,
+            'staleHits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'refreshErrors': self.refresh_errors,
+            'staleIfErrorHits': self.stale_if_error_hits
+        }
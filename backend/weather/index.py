@@ -1,29 +1,62 @@
 """
 Business: Get real weather data for a city using Open-Meteo API
-Args: event with httpMethod, queryStringParameters (city, lat, lon)
+Args: event with httpMethod, queryStringParameters (city, lat, lon, sections, fields, hours, days,
+      history_days, action=cache-stats),
+      body or repeated lat/lon params with a list of locations for batch mode
 Returns: HTTP response with weather data including temperature, conditions, sun times, hourly and daily forecasts
 """
 
 import json
-import urllib.request
-import urllib.parse
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+import circuit_breaker
+import columns
+import gazetteer
+import http_cache
+import http_client
+import observation_store
+import projection
+import shared_cache
+from forecast_cache import ForecastCache, snap
+from provider_race import ProviderStats, first_valid, call as call_provider
+from single_flight import SingleFlight, normalize_url
+
+forecast_cache = ForecastCache()
+upstream_flights = SingleFlight()
+provider_stats = ProviderStats()
+owm_pool = ThreadPoolExecutor(max_workers=4)
+
+HEDGE_DELAY_MS = os.environ.get('WEATHER_HEDGE_DELAY_MS')
+
+SHARED_CACHE_TTL = int(os.environ.get('UPSTREAM_CACHE_TTL', '1800'))
+
+# Browser cache lifetime for a last-good payload served while the upstream is failing
+STALE_MAX_AGE = 60
+
+BATCH_CHUNK_SIZE = int(os.environ.get('BATCH_CHUNK_SIZE', '50'))
+MAX_BATCH_LOCATIONS = 500
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&{query}"
+
+# Expected upstream refresh cadence in seconds: Open-Meteo current conditions are 15-minutely,
+# hourly/daily model output hourly; OpenWeatherMap refreshes roughly every 10 minutes
+UPDATE_PERIODS = {'open-meteo-current': 900, 'open-meteo': 3600, 'owm': 600}
+
+def fetch_json(url: str) -> Any:
+    """Fetch JSON from upstream through its circuit breaker, sharing the call with concurrent identical requests"""
+    breaker = circuit_breaker.for_url(url)
+    data, _ = upstream_flights.do(normalize_url(url), lambda: breaker.call(lambda: http_client.get_json(url)))
+    return data
 
 def get_coordinates(city: str) -> Optional[Dict[str, float]]:
-    """Get coordinates for a city using geocoding"""
-    cities_coords = {
-        'москва': {'lat': 55.7558, 'lon': 37.6173},
-        'санкт-петербург': {'lat': 59.9311, 'lon': 30.3609},
-        'новосибирск': {'lat': 55.0084, 'lon': 82.9357},
-        'екатеринбург': {'lat': 56.8389, 'lon': 60.6057},
-        'moscow': {'lat': 55.7558, 'lon': 37.6173},
-        'saint petersburg': {'lat': 59.9311, 'lon': 30.3609},
-        'novosibirsk': {'lat': 55.0084, 'lon': 82.9357},
-        'yekaterinburg': {'lat': 56.8389, 'lon': 60.6057}
-    }
-    return cities_coords.get(city.lower())
+    """Get coordinates for a city from the local gazetteer"""
+    place = gazetteer.lookup(city)
+    if not place:
+        return None
+    return {'lat': place['lat'], 'lon': place['lon']}
 
 def fetch_openweathermap_data(lat: float, lon: float, api_key: str) -> Dict[str, Any]:
     """Fetch weather from OpenWeatherMap API"""
@@ -31,11 +64,9 @@ def fetch_openweathermap_data(lat: float, lon: float, api_key: str) -> Dict[str,
         current_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric&lang=ru"
         forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric&lang=ru"
         
-        with urllib.request.urlopen(current_url) as response:
-            current_data = json.loads(response.read().decode())
-        
-        with urllib.request.urlopen(forecast_url) as response:
-            forecast_data = json.loads(response.read().decode())
+        current_future = owm_pool.submit(fetch_json, current_url)
+        forecast_data = fetch_json(forecast_url)
+        current_data = current_future.result()
         
         weather_icons = {
             '01d': 'Sun', '01n': 'Moon', '02d': 'CloudSun', '02n': 'CloudMoon',
@@ -115,6 +146,317 @@ def fetch_openweathermap_data(lat: float, lon: float, api_key: str) -> Dict[str,
         print(f"OpenWeatherMap API error: {e}")
         return None
 
+def fetch_open_meteo_data(lat: float, lon: float, plan: Dict[str, Any] = projection.DEFAULT_PLAN) -> Dict[str, Any]:
+    """Fetch raw forecast from Open-Meteo API with only the variables the plan needs"""
+    return fetch_json(OPEN_METEO_URL.format(lat=lat, lon=lon, query=projection.build_query(plan)))
+
+WEATHER_CODES = {
+    0: 'Ясно', 1: 'Малооблачно', 2: 'Переменная облачность', 3: 'Облачно',
+    45: 'Туман', 48: 'Изморозь', 51: 'Легкая морось', 53: 'Морось', 55: 'Сильная морось',
+    61: 'Небольшой дождь', 63: 'Дождь', 65: 'Сильный дождь',
+    71: 'Небольшой снег', 73: 'Снег', 75: 'Сильный снег',
+    80: 'Ливень', 81: 'Сильный ливень', 82: 'Очень сильный ливень',
+    95: 'Гроза', 96: 'Гроза с градом', 99: 'Сильная гроза с градом'
+}
+
+WEATHER_ICONS = {
+    0: 'Sun', 1: 'CloudSun', 2: 'CloudSun', 3: 'Cloud',
+    45: 'Cloud', 48: 'Cloud', 51: 'CloudDrizzle', 53: 'CloudDrizzle', 55: 'CloudDrizzle',
+    61: 'CloudRain', 63: 'CloudRain', 65: 'CloudRain',
+    71: 'CloudSnow', 73: 'CloudSnow', 75: 'CloudSnow',
+    80: 'CloudRain', 81: 'CloudRain', 82: 'CloudRain',
+    95: 'CloudLightning', 96: 'CloudLightning', 99: 'CloudLightning'
+}
+
+DAY_LABELS = ['Сегодня', 'Завтра', 'Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс', 'Пн']
+
+HOURLY_COLUMNS = [
+    ('time', lambda b, s, e: columns.hour_labels(b.get('time', [])[s:e])),
+    ('temp', lambda b, s, e: columns.round_int(columns.window(b, 'temperature_2m', s, e))),
+    ('icon', lambda b, s, e: columns.map_codes(columns.window(b, 'weather_code', s, e), WEATHER_ICONS, 'Cloud')),
+    ('precip', lambda b, s, e: columns.window(b, 'precipitation_probability', s, e)),
+    ('rain', lambda b, s, e: columns.round_1(columns.window(b, 'rain', s, e))),
+    ('snow', lambda b, s, e: columns.round_1(columns.window(b, 'snowfall', s, e))),
+    ('precipitation', lambda b, s, e: columns.round_1(columns.window(b, 'precipitation', s, e))),
+    ('pressure', lambda b, s, e: columns.round_int(columns.window(b, 'pressure_msl', s, e)))
+]
+
+DAILY_COLUMNS = [
+    ('day', lambda b, s, e: [DAY_LABELS[idx] if idx < len(DAY_LABELS) else t for idx, t in enumerate(b.get('time', [])[s:e])]),
+    ('high', lambda b, s, e: columns.round_int(columns.window(b, 'temperature_2m_max', s, e))),
+    ('low', lambda b, s, e: columns.round_int(columns.window(b, 'temperature_2m_min', s, e))),
+    ('icon', lambda b, s, e: columns.map_codes(columns.window(b, 'weather_code', s, e), WEATHER_ICONS, 'Cloud')),
+    ('precip', lambda b, s, e: columns.window(b, 'precipitation_probability_max', s, e)),
+    ('precipitation', lambda b, s, e: columns.round_1(columns.window(b, 'precipitation_sum', s, e))),
+    ('rain', lambda b, s, e: columns.round_1(columns.window(b, 'rain_sum', s, e))),
+    ('snow', lambda b, s, e: columns.round_1(columns.window(b, 'snowfall_sum', s, e))),
+    ('condition', lambda b, s, e: columns.map_codes(columns.window(b, 'weather_code', s, e), WEATHER_CODES, 'Неизвестно')),
+    ('pressureMax', lambda b, s, e: columns.round_int(columns.window(b, 'pressure_msl_max', s, e))),
+    ('pressureMin', lambda b, s, e: columns.round_int(columns.window(b, 'pressure_msl_min', s, e)))
+]
+
+HISTORY_COLUMNS = [('date', lambda b, s, e: b.get('time', [])[s:e])] + [
+    column for column in DAILY_COLUMNS if column[0] not in ('day', 'precip')
+]
+
+def build_rows(spec: List[Tuple[str, Any]], block: Dict[str, Any], start: int, end: int,
+               fields: Optional[set] = None) -> List[Dict[str, Any]]:
+    """Rows for the [start, end) window, computing only requested fields; the leading key field is always kept"""
+    return columns.rows([
+        (name, make(block, start, end)) for idx, (name, make) in enumerate(spec)
+        if idx == 0 or fields is None or name in fields
+    ])
+
+def build_hourly(hourly: Dict[str, Any], start: int, end: int, fields: Optional[set] = None) -> List[Dict[str, Any]]:
+    """Hourly rows for the [start, end) window of Open-Meteo hourly arrays"""
+    return build_rows(HOURLY_COLUMNS, hourly, start, end, fields)
+
+def build_history(daily: Dict[str, Any], start: int, end: int, fields: Optional[set] = None) -> List[Dict[str, Any]]:
+    """Past-day rows for the [start, end) window of Open-Meteo daily arrays"""
+    return build_rows(HISTORY_COLUMNS, daily, start, end, fields)
+
+def build_daily(daily: Dict[str, Any], start: int, end: int, fields: Optional[set] = None) -> List[Dict[str, Any]]:
+    """Forecast-day rows for the [start, end) window of Open-Meteo daily arrays"""
+    return build_rows(DAILY_COLUMNS, daily, start, end, fields)
+
+def build_current(current: Dict[str, Any], fields: Optional[set] = None) -> Dict[str, Any]:
+    code = current.get('weather_code', 0)
+    values = {
+        'temp': lambda: round(current.get('temperature_2m', 0)),
+        'feelsLike': lambda: round(current.get('apparent_temperature', 0)),
+        'condition': lambda: WEATHER_CODES.get(code, 'Неизвестно'),
+        'icon': lambda: WEATHER_ICONS.get(code, 'Cloud'),
+        'humidity': lambda: current.get('relative_humidity_2m', 0),
+        'windSpeed': lambda: round(current.get('wind_speed_10m', 0)),
+        'windDirection': lambda: current.get('wind_direction_10m', 0),
+        'pressure': lambda: round(current.get('pressure_msl', 0)),
+        'cloudCover': lambda: current.get('cloud_cover', 0),
+        'precipitation': lambda: current.get('precipitation', 0)
+    }
+    return {name: make() for name, make in values.items() if fields is None or name in fields}
+
+def build_open_meteo_result(data: Dict[str, Any], city: str,
+                            plan: Dict[str, Any] = projection.DEFAULT_PLAN) -> Dict[str, Any]:
+    """Transform a raw Open-Meteo forecast into the API response shape, building only the planned sections"""
+    hourly = data.get('hourly', {})
+    daily = data.get('daily', {})
+    fields = plan['fields']
+    sections = plan['sections']
+    
+    total_hourly = len(hourly.get('time', []))
+    total_daily = len(daily.get('time', []))
+    today_hour = min(plan['past_days'] * 24, total_hourly)
+    today = min(plan['past_days'], total_daily)
+    
+    result: Dict[str, Any] = {'city': city}
+    if 'current' in sections:
+        result['current'] = build_current(data.get('current', {}), fields)
+    if 'hourly' in sections:
+        result['hourly'] = build_hourly(hourly, today_hour, min(today_hour + plan['hours'], total_hourly), fields)
+    if 'daily' in sections:
+        result['daily'] = build_daily(daily, today, min(today + plan['days'], total_daily), fields)
+    if 'history' in sections and plan['history_inline']:
+        result['history'] = build_history(daily, max(0, today - plan['history_days']), today, fields)
+    if 'sun' in sections:
+        sunrise = daily.get('sunrise') or []
+        sunset = daily.get('sunset') or []
+        result['sun'] = {
+            'sunrise': sunrise[today] if today < len(sunrise) else '',
+            'sunset': sunset[today] if today < len(sunset) else ''
+        }
+    return result
+
+def get_owm_result(lat: float, lon: float, api_key: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    key = forecast_cache.key('owm', lat, lon)
+    return forecast_cache.get_or_fetch(
+        key, lambda: shared_cache.fetch_through(
+            'owm', key[1], key[2], key[3], SHARED_CACHE_TTL,
+            lambda: fetch_openweathermap_data(key[1], key[2], api_key)
+        )
+    )
+
+def get_open_meteo_result(lat: float, lon: float, city: str, plan: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    key = forecast_cache.key('open-meteo', lat, lon, projection.plan_variant(plan))
+    data, cache_state = forecast_cache.get_or_fetch(
+        key, lambda: shared_cache.fetch_through(
+            'open-meteo', key[1], key[2], key[3], SHARED_CACHE_TTL,
+            lambda: fetch_open_meteo_data(key[1], key[2], plan)
+        )
+    )
+    observation_store.remember_offset(key[1], key[2], data.get('utc_offset_seconds'))
+    return build_open_meteo_result(data, city, plan), cache_state
+
+def get_last_good(lat: float, lon: float, city: str, api_key: Optional[str],
+                  plan: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any], str]]:
+    """Most recent retained payload for the location from L1 or the shared cache, regardless of age"""
+    key = forecast_cache.key('open-meteo', lat, lon, projection.plan_variant(plan))
+    data = forecast_cache.last_good(key) or shared_cache.read_stale(*key)
+    if data:
+        return 'open-meteo', build_open_meteo_result(data, city, plan), 'STALE-IF-ERROR'
+    if api_key:
+        key = forecast_cache.key('owm', lat, lon)
+        data = forecast_cache.last_good(key) or shared_cache.read_stale(*key)
+        if data:
+            return 'owm', projection.project_result(data, plan), 'STALE-IF-ERROR'
+    return None
+
+def resolve_forecast(lat: float, lon: float, city: str, api_key: Optional[str],
+                     plan: Dict[str, Any] = projection.DEFAULT_PLAN) -> Tuple[str, Dict[str, Any], str]:
+    """Live forecast, or the last good payload marked stale when every provider is failing or circuit-open"""
+    try:
+        return resolve_live_forecast(lat, lon, city, api_key, plan)
+    except Exception as e:
+        fallback = get_last_good(lat, lon, city, api_key, plan)
+        if fallback is None:
+            raise
+        print(f"Serving stale forecast after upstream error: {e}")
+        provider, result, cache_state = fallback
+        return provider, {**result, 'stale': True}, cache_state
+
+def fetched_upstream(value: Any) -> bool:
+    """Provider results answered from the L1 cache (HIT, STALE) say nothing about provider latency"""
+    return value is None or value[1] == 'MISS'
+
+def resolve_live_forecast(lat: float, lon: float, city: str, api_key: Optional[str],
+                          plan: Dict[str, Any] = projection.DEFAULT_PLAN) -> Tuple[str, Dict[str, Any], str]:
+    """Pick OpenWeatherMap with Open-Meteo fallback, hedged after WEATHER_HEDGE_DELAY_MS when configured"""
+    open_meteo = ('open-meteo', lambda: get_open_meteo_result(lat, lon, city, plan))
+    if not api_key:
+        result, cache_state = call_provider(provider_stats, *open_meteo, fetched=fetched_upstream)
+        return 'open-meteo', result, cache_state
+    
+    hedge_delay = float(HEDGE_DELAY_MS) / 1000 if HEDGE_DELAY_MS else None
+    provider, (result, cache_state) = first_valid(
+        provider_stats,
+        ('owm', lambda: get_owm_result(lat, lon, api_key)),
+        open_meteo,
+        hedge_delay=hedge_delay,
+        is_valid=lambda value: value is not None and bool(value[0]),
+        fetched=fetched_upstream
+    )
+    if provider == 'owm':
+        result = projection.project_result(result, plan)
+    return provider, result, cache_state
+
+def attach_stored_history(result: Dict[str, Any], lat: float, lon: float, plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Serve the history section from the daily observation store, keeping section order"""
+    cell_lat, cell_lon = snap(lat, lon, forecast_cache.grid_step)
+    block = observation_store.history_block(cell_lat, cell_lon, plan['history_days'], fetch_json)
+    history = build_history(block, 0, len(block['time']), plan['fields'])
+    
+    merged = {key: value for key, value in result.items() if key not in projection.SECTIONS}
+    for section in projection.SECTIONS:
+        if section == 'history':
+            merged['history'] = history
+        elif section in result:
+            merged[section] = result[section]
+    return merged
+
+def parse_batch_locations(event: Dict[str, Any], method: str) -> Optional[List[Dict[str, Any]]]:
+    """Locations from a POST body {'locations': [...]} or repeated lat/lon query params; None if not a batch"""
+    if method == 'POST':
+        body = json.loads(event.get('body') or '{}')
+        return [
+            item if isinstance(item, dict) else {'lat': item[0], 'lon': item[1]}
+            for item in body.get('locations', [])
+        ]
+    
+    multi = event.get('multiValueQueryStringParameters') or {}
+    lats = multi.get('lat') or []
+    lons = multi.get('lon') or []
+    if len(lats) < 2 and len(lons) < 2:
+        return None
+    return [{'lat': lat, 'lon': lon} for lat, lon in zip(lats, lons)]
+
+def fetch_open_meteo_batch(cells: List[Tuple[float, float]], plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Fetch several grid cells in one Open-Meteo call using comma-separated coordinates"""
+    data = fetch_json(OPEN_METEO_URL.format(
+        lat=','.join(str(cell[0]) for cell in cells),
+        lon=','.join(str(cell[1]) for cell in cells),
+        query=projection.build_query(plan)
+    ))
+    return data if isinstance(data, list) else [data]
+
+def get_forecast_batch(locations: List[Dict[str, Any]], plan: Dict[str, Any] = projection.DEFAULT_PLAN) -> Dict[str, Any]:
+    """Resolve many locations with as few upstream calls as possible"""
+    variant = projection.plan_variant(plan)
+    items: List[Dict[str, Any]] = []
+    payloads: Dict[Tuple, Any] = {}
+    errors: Dict[Tuple, str] = {}
+    missing: List[Tuple] = []
+    seen = set()
+    
+    for location in locations:
+        try:
+            lat = float(location.get('lat'))
+            lon = float(location.get('lon'))
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError('coordinates out of range')
+        except (TypeError, ValueError) as e:
+            items.append({'lat': location.get('lat'), 'lon': location.get('lon'), 'error': f'Invalid coordinates: {e}'})
+            continue
+        
+        key = forecast_cache.key('open-meteo', lat, lon, variant)
+        items.append({'lat': lat, 'lon': lon, 'city': location.get('city', ''), 'key': key})
+        if key in seen:
+            continue
+        seen.add(key)
+        data, state = forecast_cache.get(key)
+        # Stale entries are refetched with the batch rather than refreshed in the background
+        forecast_cache.record('fresh' if state == 'fresh' else 'miss')
+        if state == 'fresh':
+            payloads[key] = data
+        else:
+            missing.append(key)
+    
+    if missing:
+        shared = shared_cache.read_many('open-meteo', [(key[1], key[2]) for key in missing], variant)
+        for key in missing:
+            if (key[1], key[2]) in shared:
+                payloads[key] = shared[(key[1], key[2])]
+                forecast_cache.put(key, payloads[key])
+        missing = [key for key in missing if key not in payloads]
+    
+    upstream_calls = 0
+    for start in range(0, len(missing), BATCH_CHUNK_SIZE):
+        chunk = missing[start:start + BATCH_CHUNK_SIZE]
+        upstream_calls += 1
+        try:
+            results = fetch_open_meteo_batch([(key[1], key[2]) for key in chunk], plan)
+            if len(results) != len(chunk):
+                raise ValueError(f'expected {len(chunk)} locations, got {len(results)}')
+        except Exception as e:
+            for key in chunk:
+                errors[key] = str(e)
+            continue
+        for key, data in zip(chunk, results):
+            payloads[key] = data
+            forecast_cache.put(key, data)
+            shared_cache.write('open-meteo', key[1], key[2], key[3], data, SHARED_CACHE_TTL)
+    
+    results = []
+    for item in items:
+        key = item.pop('key', None)
+        if key is None:
+            results.append(item)
+        elif key in payloads:
+            try:
+                results.append({'lat': item['lat'], 'lon': item['lon'], **build_open_meteo_result(payloads[key], item['city'], plan)})
+            except Exception as e:
+                results.append({'lat': item['lat'], 'lon': item['lon'], 'error': str(e)})
+        else:
+            results.append({'lat': item['lat'], 'lon': item['lon'], 'error': errors.get(key, 'No data')})
+    
+    return {'results': results, 'upstreamCalls': upstream_calls}
+
+def get_max_age(provider: str, plan: Dict[str, Any]) -> int:
+    """Browser cache lifetime: until the provider's next expected update"""
+    if provider == 'open-meteo' and 'current' in plan['sections']:
+        period = UPDATE_PERIODS['open-meteo-current']
+    else:
+        period = UPDATE_PERIODS.get(provider, UPDATE_PERIODS['open-meteo'])
+    return http_cache.seconds_until_next(period)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -123,15 +465,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Accept-Encoding',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    if method != 'GET':
+    if method not in ('GET', 'POST'):
         return {
             'statusCode': 405,
             'headers': {
@@ -143,154 +485,104 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     params = event.get('queryStringParameters') or {}
-    city = params.get('city', 'Москва')
-    
-    coords = get_coordinates(city)
-    if not coords:
-        coords = {'lat': 55.7558, 'lon': 37.6173}
     
-    lat = float(params.get('lat', coords['lat']))
-    lon = float(params.get('lon', coords['lon']))
+    try:
+        locations = parse_batch_locations(event, method)
+    except (ValueError, TypeError, IndexError, AttributeError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': f'Invalid batch request: {e}'}),
+            'isBase64Encoded': False
+        }
     
-    weather_api_key = os.environ.get('WEATHER_API_KEY')
+    try:
+        plan = projection.parse_plan(
+            params, history_inline=locations is not None or not observation_store.enabled()
+        )
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
     
-    if weather_api_key:
-        result = fetch_openweathermap_data(lat, lon, weather_api_key)
-        if result:
+    if locations is not None:
+        if len(locations) > MAX_BATCH_LOCATIONS:
             return {
-                'statusCode': 200,
+                'statusCode': 400,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(result, ensure_ascii=False),
+                'body': json.dumps({'error': f'Too many locations, maximum is {MAX_BATCH_LOCATIONS}'}),
                 'isBase64Encoded': False
             }
-    
-    try:
-        api_url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,cloud_cover,pressure_msl,surface_pressure,wind_speed_10m,wind_direction_10m&hourly=temperature_2m,precipitation_probability,weather_code,precipitation,rain,snowfall,pressure_msl&daily=weather_code,temperature_2m_max,temperature_2m_min,sunrise,sunset,precipitation_probability_max,precipitation_sum,rain_sum,snowfall_sum,pressure_msl_max,pressure_msl_min&timezone=auto&forecast_days=14&past_days=7"
-        
-        with urllib.request.urlopen(api_url) as response:
-            data = json.loads(response.read().decode())
-        
-        current = data.get('current', {})
-        hourly = data.get('hourly', {})
-        daily = data.get('daily', {})
-        
-        weather_codes = {
-            0: 'Ясно', 1: 'Малооблачно', 2: 'Переменная облачность', 3: 'Облачно',
-            45: 'Туман', 48: 'Изморозь', 51: 'Легкая морось', 53: 'Морось', 55: 'Сильная морось',
-            61: 'Небольшой дождь', 63: 'Дождь', 65: 'Сильный дождь',
-            71: 'Небольшой снег', 73: 'Снег', 75: 'Сильный снег',
-            80: 'Ливень', 81: 'Сильный ливень', 82: 'Очень сильный ливень',
-            95: 'Гроза', 96: 'Гроза с градом', 99: 'Сильная гроза с градом'
-        }
-        
-        weather_icons = {
-            0: 'Sun', 1: 'CloudSun', 2: 'CloudSun', 3: 'Cloud',
-            45: 'Cloud', 48: 'Cloud', 51: 'CloudDrizzle', 53: 'CloudDrizzle', 55: 'CloudDrizzle',
-            61: 'CloudRain', 63: 'CloudRain', 65: 'CloudRain',
-            71: 'CloudSnow', 73: 'CloudSnow', 75: 'CloudSnow',
-            80: 'CloudRain', 81: 'CloudRain', 82: 'CloudRain',
-            95: 'CloudLightning', 96: 'CloudLightning', 99: 'CloudLightning'
-        }
-        
-        current_weather_code = current.get('weather_code', 0)
-        
-        result = {
-            'city': city,
-            'current': {
-                'temp': round(current.get('temperature_2m', 0)),
-                'feelsLike': round(current.get('apparent_temperature', 0)),
-                'condition': weather_codes.get(current_weather_code, 'Неизвестно'),
-                'icon': weather_icons.get(current_weather_code, 'Cloud'),
-                'humidity': current.get('relative_humidity_2m', 0),
-                'windSpeed': round(current.get('wind_speed_10m', 0)),
-                'windDirection': current.get('wind_direction_10m', 0),
-                'pressure': round(current.get('pressure_msl', 0)),
-                'cloudCover': current.get('cloud_cover', 0),
-                'precipitation': current.get('precipitation', 0)
+        return http_cache.encode_response(event, {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             },
-            'hourly': [],
-            'daily': [],
-            'history': [],
-            'sun': {
-                'sunrise': daily.get('sunrise', [])[0] if daily.get('sunrise') else '',
-                'sunset': daily.get('sunset', [])[0] if daily.get('sunset') else ''
-            }
-        }
-        
-        hourly_times = hourly.get('time', [])
-        total_hourly = len(hourly_times)
-        
-        for i in range(min(24, total_hourly)):
-            time_str = hourly_times[i]
-            hour = datetime.fromisoformat(time_str).strftime('%H:%M')
-            weather_code = hourly.get('weather_code', [])[i] if i < len(hourly.get('weather_code', [])) else 0
-            
-            result['hourly'].append({
-                'time': hour,
-                'temp': round(hourly.get('temperature_2m', [])[i]) if i < len(hourly.get('temperature_2m', [])) else 0,
-                'icon': weather_icons.get(weather_code, 'Cloud'),
-                'precip': hourly.get('precipitation_probability', [])[i] if i < len(hourly.get('precipitation_probability', [])) else 0,
-                'rain': round(hourly.get('rain', [])[i], 1) if i < len(hourly.get('rain', [])) else 0,
-                'snow': round(hourly.get('snowfall', [])[i], 1) if i < len(hourly.get('snowfall', [])) else 0,
-                'precipitation': round(hourly.get('precipitation', [])[i], 1) if i < len(hourly.get('precipitation', [])) else 0,
-                'pressure': round(hourly.get('pressure_msl', [])[i]) if i < len(hourly.get('pressure_msl', [])) else 0
-            })
-        
-        daily_times = daily.get('time', [])
-        total_daily = len(daily_times)
-        
-        history_start = max(0, total_daily - 17)
-        for i in range(history_start, total_daily - 10):
-            if i >= 0:
-                weather_code = daily.get('weather_code', [])[i] if i < len(daily.get('weather_code', [])) else 0
-                date_str = daily_times[i]
-                
-                result['history'].append({
-                    'date': date_str,
-                    'high': round(daily.get('temperature_2m_max', [])[i]) if i < len(daily.get('temperature_2m_max', [])) else 0,
-                    'low': round(daily.get('temperature_2m_min', [])[i]) if i < len(daily.get('temperature_2m_min', [])) else 0,
-                    'icon': weather_icons.get(weather_code, 'Cloud'),
-                    'precipitation': round(daily.get('precipitation_sum', [])[i], 1) if i < len(daily.get('precipitation_sum', [])) else 0,
-                    'rain': round(daily.get('rain_sum', [])[i], 1) if i < len(daily.get('rain_sum', [])) else 0,
-                    'snow': round(daily.get('snowfall_sum', [])[i], 1) if i < len(daily.get('snowfall_sum', [])) else 0,
-                    'condition': weather_codes.get(weather_code, 'Неизвестно'),
-                    'pressureMax': round(daily.get('pressure_msl_max', [])[i]) if i < len(daily.get('pressure_msl_max', [])) else 0,
-                    'pressureMin': round(daily.get('pressure_msl_min', [])[i]) if i < len(daily.get('pressure_msl_min', [])) else 0
-                })
-        
-        days = ['Сегодня', 'Завтра', 'Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс', 'Пн']
-        forecast_start = max(0, total_daily - 14)
-        forecast_end = min(forecast_start + 10, total_daily)
-        for i in range(forecast_start, forecast_end):
-            weather_code = daily.get('weather_code', [])[i] if i < len(daily.get('weather_code', [])) else 0
-            day_index = i - forecast_start
-            
-            result['daily'].append({
-                'day': days[day_index] if day_index < len(days) else daily_times[i],
-                'high': round(daily.get('temperature_2m_max', [])[i]) if i < len(daily.get('temperature_2m_max', [])) else 0,
-                'low': round(daily.get('temperature_2m_min', [])[i]) if i < len(daily.get('temperature_2m_min', [])) else 0,
-                'icon': weather_icons.get(weather_code, 'Cloud'),
-                'precip': daily.get('precipitation_probability_max', [])[i] if i < len(daily.get('precipitation_probability_max', [])) else 0,
-                'precipitation': round(daily.get('precipitation_sum', [])[i], 1) if i < len(daily.get('precipitation_sum', [])) else 0,
-                'rain': round(daily.get('rain_sum', [])[i], 1) if i < len(daily.get('rain_sum', [])) else 0,
-                'snow': round(daily.get('snowfall_sum', [])[i], 1) if i < len(daily.get('snowfall_sum', [])) else 0,
-                'condition': weather_codes.get(weather_code, 'Неизвестно'),
-                'pressureMax': round(daily.get('pressure_msl_max', [])[i]) if i < len(daily.get('pressure_msl_max', [])) else 0,
-                'pressureMin': round(daily.get('pressure_msl_min', [])[i]) if i < len(daily.get('pressure_msl_min', [])) else 0
-            })
-        
+            'body': json.dumps(get_forecast_batch(locations, plan), ensure_ascii=False),
+            'isBase64Encoded': False
+        })
+    
+    if params.get('action') == 'cache-stats':
         return {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(result, ensure_ascii=False),
+            'body': json.dumps({
+                'forecastCache': forecast_cache.stats(),
+                'singleFlight': upstream_flights.stats(),
+                'providers': provider_stats.stats(),
+                'httpClient': http_client.stats(),
+                'circuits': circuit_breaker.stats()
+            }),
             'isBase64Encoded': False
         }
+    
+    city = params.get('city', 'Москва')
+    
+    coords = get_coordinates(city)
+    if not coords:
+        coords = {'lat': 55.7558, 'lon': 37.6173}
+    
+    lat = float(params.get('lat', coords['lat']))
+    lon = float(params.get('lon', coords['lon']))
+    
+    weather_api_key = os.environ.get('WEATHER_API_KEY')
+    
+    try:
+        if projection.needs_upstream(plan):
+            provider, result, cache_state = resolve_forecast(lat, lon, city, weather_api_key, plan)
+        else:
+            # Nothing to ask the forecast providers for: an empty payload builds the same sections
+            provider, result, cache_state = 'observation-store', build_open_meteo_result({}, city, plan), 'STORE'
+        if 'history' in plan['sections'] and not plan['history_inline']:
+            result = attach_stored_history(result, lat, lon, plan)
+        
+        return http_cache.conditional_response(
+            event,
+            json.dumps(result, ensure_ascii=False),
+            {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'X-Cache': cache_state,
+                'X-Provider': provider
+            },
+            max_age=STALE_MAX_AGE if cache_state == 'STALE-IF-ERROR' else get_max_age(provider, plan)
+        )
         
     except Exception as e:
         return {
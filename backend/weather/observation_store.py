@@ -0,0 +1,177 @@
+"""
+Persistent daily observations per grid cell (daily_observations table): past days are fetched
+from Open-Meteo once, then served from Postgres for any lookback up to a year
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+DAILY_VARIABLES = [
+    'weather_code', 'temperature_2m_max', 'temperature_2m_min', 'precipitation_sum',
+    'rain_sum', 'snowfall_sum', 'pressure_msl_max', 'pressure_msl_min'
+]
+
+RECENT_URL = "https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&daily={daily}&timezone=auto&past_days={past_days}&forecast_days=1"
+ARCHIVE_URL = "https://historical-forecast-api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&daily={daily}&timezone=auto&start_date={start}&end_date={end}"
+
+MAX_RECENT_DAYS = 92
+# Stored days with NULL values are fetched again while upstream may still fill them in
+INCOMPLETE_RECHECK_DAYS = 7
+
+_conn = None
+_utc_offsets: Dict[Tuple[float, float], int] = {}
+
+
+def enabled() -> bool:
+    return bool(os.environ.get('DATABASE_URL'))
+
+
+def _get_connection():
+    global _conn
+    if _conn is None or _conn.closed:
+        _conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _conn.autocommit = True
+    return _conn
+
+
+def _reset_connection() -> None:
+    global _conn
+    try:
+        if _conn is not None:
+            _conn.close()
+    except Exception:
+        pass
+    _conn = None
+
+
+def remember_offset(cell_lat: float, cell_lon: float, utc_offset_seconds: Optional[int]) -> None:
+    """Record the cell's UTC offset from any Open-Meteo response so local dates can be computed"""
+    if utc_offset_seconds is not None:
+        _utc_offsets[(cell_lat, cell_lon)] = int(utc_offset_seconds)
+
+
+def local_today(cell_lat: float, cell_lon: float) -> date:
+    offset = _utc_offsets.get((cell_lat, cell_lon), 0)
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset)).date()
+
+
+def load(cell_lat: float, cell_lon: float, start: date, end: date) -> Dict[date, Dict[str, Any]]:
+    """Stored rows for start..end inclusive"""
+    try:
+        with _get_connection().cursor() as cur:
+            cur.execute(f'''
+                SELECT obs_date, {', '.join(DAILY_VARIABLES)} FROM daily_observations
+                WHERE cell_lat = %s AND cell_lon = %s AND obs_date BETWEEN %s AND %s
+            ''', (cell_lat, cell_lon, start, end))
+            return {row[0]: dict(zip(DAILY_VARIABLES, row[1:])) for row in cur.fetchall()}
+    except Exception as e:
+        print(f"Observation store read error: {e}")
+        _reset_connection()
+        return {}
+
+
+def save(cell_lat: float, cell_lon: float, rows: Dict[date, Dict[str, Any]]) -> None:
+    """Insert new days; a stored day is only updated to fill values that are still NULL"""
+    if not rows:
+        return
+    try:
+        with _get_connection().cursor() as cur:
+            execute_values(cur, f'''
+                INSERT INTO daily_observations (cell_lat, cell_lon, obs_date, {', '.join(DAILY_VARIABLES)})
+                VALUES %s
+                ON CONFLICT (cell_lat, cell_lon, obs_date) DO UPDATE SET
+                    {', '.join(f'{name} = COALESCE(daily_observations.{name}, EXCLUDED.{name})' for name in DAILY_VARIABLES)},
+                    fetched_at = CURRENT_TIMESTAMP
+                WHERE {' OR '.join(f'daily_observations.{name} IS NULL' for name in DAILY_VARIABLES)}
+            ''', [
+                (cell_lat, cell_lon, day, *[row.get(name) for name in DAILY_VARIABLES])
+                for day, row in rows.items()
+            ])
+    except Exception as e:
+        print(f"Observation store write error: {e}")
+        _reset_connection()
+
+
+def incomplete(row: Dict[str, Any]) -> bool:
+    return any(row.get(name) is None for name in DAILY_VARIABLES)
+
+
+def _rows_from_daily(daily: Dict[str, Any], before: Optional[date] = None) -> Dict[date, Dict[str, Any]]:
+    rows = {}
+    for idx, day_str in enumerate(daily.get('time', [])):
+        day = date.fromisoformat(day_str)
+        if before is not None and day >= before:
+            continue
+        rows[day] = {
+            name: (daily.get(name) or [])[idx] if idx < len(daily.get(name) or []) else None
+            for name in DAILY_VARIABLES
+        }
+    return rows
+
+
+def fetch_days(cell_lat: float, cell_lon: float, missing: List[date],
+               fetch_json: Callable[[str], Any]) -> Tuple[Dict[date, Dict[str, Any]], date]:
+    """Fetch completed days covering the missing dates; returns (rows, local today)"""
+    daily_param = ','.join(DAILY_VARIABLES)
+    today = local_today(cell_lat, cell_lon)
+    recent_start = today - timedelta(days=MAX_RECENT_DAYS)
+    rows: Dict[date, Dict[str, Any]] = {}
+
+    archived = [day for day in missing if day < recent_start]
+    if archived:
+        data = fetch_json(ARCHIVE_URL.format(
+            lat=cell_lat, lon=cell_lon, daily=daily_param,
+            start=archived[0].isoformat(), end=archived[-1].isoformat()
+        ))
+        rows.update(_rows_from_daily(data.get('daily', {})))
+
+    recent = [day for day in missing if day >= recent_start]
+    if recent:
+        # One extra past day covers the gap when the estimated local date is behind the real one
+        past_days = min(MAX_RECENT_DAYS, max(1, (today - recent[0]).days + 1))
+        data = fetch_json(RECENT_URL.format(lat=cell_lat, lon=cell_lon, daily=daily_param, past_days=past_days))
+        remember_offset(cell_lat, cell_lon, data.get('utc_offset_seconds'))
+        daily = data.get('daily', {})
+        if daily.get('time'):
+            today = date.fromisoformat(daily['time'][-1])
+        rows.update(_rows_from_daily(daily, before=today))
+    return rows, today
+
+
+def history_block(cell_lat: float, cell_lon: float, days: int,
+                  fetch_json: Callable[[str], Any]) -> Dict[str, List[Any]]:
+    """Open-Meteo-style daily columns for the `days` completed days before today in the cell's timezone"""
+    today = local_today(cell_lat, cell_lon)
+    start = today - timedelta(days=days)
+    rows = load(cell_lat, cell_lon, start - timedelta(days=1), today)
+
+    recheck_from = today - timedelta(days=INCOMPLETE_RECHECK_DAYS)
+    missing = [
+        day for day in (start + timedelta(days=n) for n in range(days))
+        if day not in rows or (day >= recheck_from and incomplete(rows[day]))
+    ]
+    if missing:
+        try:
+            fetched, today = fetch_days(cell_lat, cell_lon, missing, fetch_json)
+        except Exception as e:
+            # Upstream down: serve whatever stored days there are rather than failing the request
+            print(f"Observation fetch error, serving stored days only: {e}")
+        else:
+            save(cell_lat, cell_lon, {day: row for day, row in fetched.items() if day not in rows or incomplete(rows[day])})
+            for day, row in fetched.items():
+                stored = rows.get(day)
+                rows[day] = row if stored is None else {
+                    name: stored[name] if stored[name] is not None else row[name] for name in DAILY_VARIABLES
+                }
+            start = today - timedelta(days=days)
+
+    dates = [start + timedelta(days=n) for n in range(days) if start + timedelta(days=n) in rows]
+    block: Dict[str, List[Any]] = {'time': [day.isoformat() for day in dates]}
+    for name in DAILY_VARIABLES:
+        # NULLs stay NULL in the table so a later fetch can fill them; the response shows 0 as before
+        block[name] = [rows[day][name] if rows[day][name] is not None else 0 for day in dates]
+    return block
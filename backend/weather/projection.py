@@ -0,0 +1,199 @@
+"""
+Section/field projection and horizon parameters: narrows the Open-Meteo query to the variables
+a request needs and tells the builders which sections and fields to produce
+"""
+
+import hashlib
+import math
+from typing import Dict, Any, List, Optional
+
+SECTIONS = ['current', 'hourly', 'daily', 'history', 'sun']
+
+# Output field -> Open-Meteo variables it is computed from
+CURRENT_FIELDS = {
+    'temp': ['temperature_2m'],
+    'feelsLike': ['apparent_temperature'],
+    'condition': ['weather_code'],
+    'icon': ['weather_code'],
+    'humidity': ['relative_humidity_2m'],
+    'windSpeed': ['wind_speed_10m'],
+    'windDirection': ['wind_direction_10m'],
+    'pressure': ['pressure_msl'],
+    'cloudCover': ['cloud_cover'],
+    'precipitation': ['precipitation']
+}
+
+HOURLY_FIELDS = {
+    'time': [],
+    'temp': ['temperature_2m'],
+    'icon': ['weather_code'],
+    'precip': ['precipitation_probability'],
+    'rain': ['rain'],
+    'snow': ['snowfall'],
+    'precipitation': ['precipitation'],
+    'pressure': ['pressure_msl']
+}
+
+DAILY_FIELDS = {
+    'day': [],
+    'high': ['temperature_2m_max'],
+    'low': ['temperature_2m_min'],
+    'icon': ['weather_code'],
+    'precip': ['precipitation_probability_max'],
+    'precipitation': ['precipitation_sum'],
+    'rain': ['rain_sum'],
+    'snow': ['snowfall_sum'],
+    'condition': ['weather_code'],
+    'pressureMax': ['pressure_msl_max'],
+    'pressureMin': ['pressure_msl_min']
+}
+
+HISTORY_FIELDS = {
+    'date': [],
+    'high': ['temperature_2m_max'],
+    'low': ['temperature_2m_min'],
+    'icon': ['weather_code'],
+    'precipitation': ['precipitation_sum'],
+    'rain': ['rain_sum'],
+    'snow': ['snowfall_sum'],
+    'condition': ['weather_code'],
+    'pressureMax': ['pressure_msl_max'],
+    'pressureMin': ['pressure_msl_min']
+}
+
+SUN_VARIABLES = ['sunrise', 'sunset']
+
+DEFAULT_HOURS = 24
+DEFAULT_DAYS = 10
+DEFAULT_HISTORY_DAYS = 7
+MAX_HOURS = 16 * 24
+MAX_DAYS = 16
+MAX_HISTORY_DAYS = 92
+MAX_STORED_HISTORY_DAYS = 365
+
+
+def _parse_list(value: Optional[str], allowed: List[str], name: str) -> Optional[List[str]]:
+    if not value:
+        return None
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {name}: {', '.join(unknown)}")
+    return items
+
+
+def _parse_int(value: Optional[str], default: int, low: int, high: int, name: str) -> int:
+    if value in (None, ''):
+        return default
+    number = int(value)
+    if not low <= number <= high:
+        raise ValueError(f'{name} must be between {low} and {high}')
+    return number
+
+
+def _variables(field_map: Dict[str, List[str]], fields: Optional[set]) -> List[str]:
+    result: List[str] = []
+    for field, variables in field_map.items():
+        if fields is None or field in fields:
+            for variable in variables:
+                if variable not in result:
+                    result.append(variable)
+    return result
+
+
+def parse_plan(params: Dict[str, Any], history_inline: bool = True) -> Dict[str, Any]:
+    """Build a request plan from sections/fields/hours/days/history_days; raises ValueError on bad input.
+
+    With history_inline=False the history section is served from the observation store,
+    so it adds nothing to the upstream query and allows longer lookbacks.
+    """
+    all_fields = sorted(set(CURRENT_FIELDS) | set(HOURLY_FIELDS) | set(DAILY_FIELDS) | set(HISTORY_FIELDS))
+    sections = _parse_list(params.get('sections'), SECTIONS, 'sections') or SECTIONS
+    fields = _parse_list(params.get('fields'), all_fields, 'fields')
+    field_set = set(fields) if fields else None
+
+    hours = _parse_int(params.get('hours'), DEFAULT_HOURS, 1, MAX_HOURS, 'hours')
+    days = _parse_int(params.get('days'), DEFAULT_DAYS, 1, MAX_DAYS, 'days')
+    max_history_days = MAX_HISTORY_DAYS if history_inline else MAX_STORED_HISTORY_DAYS
+    history_days = _parse_int(params.get('history_days'), DEFAULT_HISTORY_DAYS, 0, max_history_days, 'history_days')
+    inline_history = 'history' in sections and history_inline
+
+    current_vars = _variables(CURRENT_FIELDS, field_set) if 'current' in sections else []
+    hourly_vars = _variables(HOURLY_FIELDS, field_set) if 'hourly' in sections else []
+    daily_vars: List[str] = []
+    if 'daily' in sections:
+        daily_vars += _variables(DAILY_FIELDS, field_set)
+    if inline_history:
+        daily_vars += [v for v in _variables(HISTORY_FIELDS, field_set) if v not in daily_vars]
+    if 'sun' in sections:
+        daily_vars += [v for v in SUN_VARIABLES if v not in daily_vars]
+
+    forecast_days = 1
+    if 'hourly' in sections:
+        forecast_days = max(forecast_days, math.ceil(hours / 24))
+    if 'daily' in sections:
+        forecast_days = max(forecast_days, days)
+
+    return {
+        'sections': [section for section in SECTIONS if section in sections],
+        'fields': field_set,
+        'hours': hours,
+        'days': days,
+        'history_days': history_days if 'history' in sections else 0,
+        'history_inline': history_inline,
+        'current_vars': current_vars,
+        'hourly_vars': hourly_vars,
+        'daily_vars': daily_vars,
+        'forecast_days': forecast_days,
+        'past_days': history_days if inline_history else 0
+    }
+
+
+DEFAULT_PLAN = parse_plan({})
+
+
+def build_query(plan: Dict[str, Any]) -> str:
+    """Open-Meteo query string (without coordinates) for the plan"""
+    parts = []
+    if plan['current_vars']:
+        parts.append('current=' + ','.join(plan['current_vars']))
+    if plan['hourly_vars']:
+        parts.append('hourly=' + ','.join(plan['hourly_vars']))
+    if plan['daily_vars']:
+        parts.append('daily=' + ','.join(plan['daily_vars']))
+    parts.append('timezone=auto')
+    parts.append(f"forecast_days={plan['forecast_days']}")
+    if plan['past_days']:
+        parts.append(f"past_days={plan['past_days']}")
+    return '&'.join(parts)
+
+
+def needs_upstream(plan: Dict[str, Any]) -> bool:
+    """False when no section asks Open-Meteo for anything, e.g. history served from the observation store"""
+    return bool(plan['current_vars'] or plan['hourly_vars'] or plan['daily_vars'])
+
+
+def plan_variant(plan: Dict[str, Any]) -> str:
+    """Stable cache key component identifying the upstream variable set and horizon"""
+    return hashlib.sha1(build_query(plan).encode()).hexdigest()[:16]
+
+
+def project_result(result: Dict[str, Any], plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply sections/fields/horizons to an already built response (used for OpenWeatherMap data)"""
+    fields = plan['fields']
+
+    def pick(row: Dict[str, Any], keep: str) -> Dict[str, Any]:
+        return row if fields is None else {k: v for k, v in row.items() if k == keep or k in fields}
+
+    projected = {key: value for key, value in result.items() if key not in SECTIONS}
+    if 'current' in plan['sections'] and 'current' in result:
+        projected['current'] = pick(result['current'], '')
+    if 'hourly' in plan['sections']:
+        projected['hourly'] = [pick(row, 'time') for row in result.get('hourly', [])[:plan['hours']]]
+    if 'daily' in plan['sections']:
+        projected['daily'] = [pick(row, 'day') for row in result.get('daily', [])[:plan['days']]]
+    if 'history' in plan['sections']:
+        projected['history'] = [pick(row, 'date') for row in result.get('history', [])][-plan['history_days']:] if plan['history_days'] else []
+    if 'sun' in plan['sections'] and 'sun' in result:
+        projected['sun'] = result['sun']
+    return projected
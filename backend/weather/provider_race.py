@@ -0,0 +1,117 @@
+"""
+Provider calls with fallback or hedging: the secondary provider starts when the primary fails
+or, in hedged mode, when it has not answered within a delay; per-provider latency and wins are recorded
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from typing import Dict, Any, Callable, Optional, Tuple
+
+provider_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('PROVIDER_POOL_SIZE', '8')))
+
+
+class NoValidResult(Exception):
+    """Every provider answered, but none with a valid result"""
+
+
+class ProviderStats:
+    """Rolling per-provider latency, error and win counters"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._providers: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(self, provider: str) -> Dict[str, Any]:
+        if provider not in self._providers:
+            self._providers[provider] = {'calls': 0, 'errors': 0, 'wins': 0, 'latencies': deque(maxlen=self.window)}
+        return self._providers[provider]
+
+    def record(self, provider: str, elapsed_ms: float, ok: bool) -> None:
+        with self._lock:
+            entry = self._entry(provider)
+            entry['calls'] += 1
+            entry['latencies'].append(elapsed_ms)
+            if not ok:
+                entry['errors'] += 1
+
+    def win(self, provider: str) -> None:
+        with self._lock:
+            self._entry(provider)['wins'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for provider, entry in self._providers.items():
+                latencies = sorted(entry['latencies'])
+                result[provider] = {
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'wins': entry['wins'],
+                    'p50Ms': round(latencies[len(latencies) // 2], 1) if latencies else None,
+                    'p95Ms': round(latencies[int(len(latencies) * 0.95)], 1) if latencies else None
+                }
+            return result
+
+
+def _always(value: Any) -> bool:
+    return True
+
+
+def _timed(stats: ProviderStats, provider: str, fn: Callable[[], Any], is_valid: Callable[[Any], bool],
+           fetched: Callable[[Any], bool] = _always) -> Any:
+    """Run fn, recording its latency unless `fetched(value)` says it was answered from a cache;
+    failures are always recorded"""
+    started = time.perf_counter()
+    try:
+        value = fn()
+    except Exception:
+        stats.record(provider, (time.perf_counter() - started) * 1000, False)
+        raise
+    if fetched(value):
+        stats.record(provider, (time.perf_counter() - started) * 1000, is_valid(value))
+    return value
+
+
+def call(stats: ProviderStats, provider: str, fn: Callable[[], Any], fetched: Callable[[Any], bool] = _always) -> Any:
+    """Call a single provider in the current thread, recording its latency"""
+    value = _timed(stats, provider, fn, lambda result: result is not None, fetched)
+    stats.win(provider)
+    return value
+
+
+def first_valid(stats: ProviderStats, primary: Tuple[str, Callable[[], Any]], secondary: Tuple[str, Callable[[], Any]],
+                hedge_delay: Optional[float] = None,
+                is_valid: Callable[[Any], bool] = lambda value: value is not None,
+                fetched: Callable[[Any], bool] = _always) -> Tuple[str, Any]:
+    """Return (provider, value) from the first provider with a valid result.
+
+    With hedge_delay=None the secondary starts only after the primary fails; otherwise it also starts
+    once the primary has been running for hedge_delay seconds, and whichever valid result arrives first wins.
+    Raises the last provider error, or NoValidResult when both answered without a valid result.
+    """
+    futures = {provider_pool.submit(_timed, stats, primary[0], primary[1], is_valid, fetched): primary[0]}
+    wait(futures, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+
+    primary_future = next(iter(futures))
+    if primary_future.done() and primary_future.exception() is None and is_valid(primary_future.result()):
+        stats.win(primary[0])
+        return primary[0], primary_future.result()
+
+    futures[provider_pool.submit(_timed, stats, secondary[0], secondary[1], is_valid, fetched)] = secondary[0]
+
+    last_error = None
+    for future in as_completed(futures):
+        if future.exception() is not None:
+            last_error = future.exception()
+            continue
+        if is_valid(future.result()):
+            stats.win(futures[future])
+            return futures[future], future.result()
+
+    if last_error is not None:
+        raise last_error
+    raise NoValidResult(f'No valid result from {primary[0]} or {secondary[0]}')
@@ -0,0 +1,83 @@
+"""
+Request coalescing: concurrent fetches of the same normalized upstream URL share one in-flight call
+"""
+
+import threading
+import urllib.parse
+from collections import deque
+from typing import Dict, Any, Callable, Tuple
+
+SECRET_PARAMS = {'appid', 'apikey', 'key', 'token'}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL with query parameters sorted"""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+def redact_url(url: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    query = [(k, '***' if k.lower() in SECRET_PARAMS else v) for k, v in urllib.parse.parse_qsl(parts.query)]
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path, urllib.parse.urlencode(query), ''))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.callers = 1
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into a single execution"""
+
+    def __init__(self, history: int = 50):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.flights = 0
+        self.coalesced = 0
+        self.max_callers = 0
+        self.recent = deque(maxlen=history)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, int]:
+        """Run fn once per key at a time; returns (result, callers sharing the result)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.callers += 1
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    self.flights += 1
+                    self.coalesced += call.callers - 1
+                    self.max_callers = max(self.max_callers, call.callers)
+                    self.recent.append({'url': redact_url(key), 'callers': call.callers})
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, call.callers
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'flights': self.flights,
+            'inFlight': len(self._calls),
+            'coalescedCallers': self.coalesced,
+            'maxCallersPerFlight': self.max_callers,
+            'recent': list(self.recent)
+        }
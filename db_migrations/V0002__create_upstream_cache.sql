@@ -0,0 +1,14 @@
+-- Общий кэш ответов внешних API (Open-Meteo, OpenWeatherMap, NOAA) для всех экземпляров функций
+CREATE TABLE IF NOT EXISTS upstream_cache (
+    provider VARCHAR(32) NOT NULL,
+    cell_lat DECIMAL(8, 4) NOT NULL,
+    cell_lon DECIMAL(8, 4) NOT NULL,
+    variables VARCHAR(64) NOT NULL DEFAULT '',
+    payload BYTEA NOT NULL,
+    fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (provider, cell_lat, cell_lon, variables)
+);
+
+-- Индекс для очистки устаревших записей
+CREATE INDEX IF NOT EXISTS idx_upstream_cache_expires_at ON upstream_cache(expires_at);
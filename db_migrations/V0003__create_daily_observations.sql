@@ -0,0 +1,16 @@
+-- Суточные наблюдения по ячейкам сетки: прошедшие дни не меняются и не запрашиваются повторно
+CREATE TABLE IF NOT EXISTS daily_observations (
+    cell_lat DECIMAL(8, 4) NOT NULL,
+    cell_lon DECIMAL(8, 4) NOT NULL,
+    obs_date DATE NOT NULL,
+    weather_code SMALLINT,
+    temperature_2m_max DOUBLE PRECISION,
+    temperature_2m_min DOUBLE PRECISION,
+    precipitation_sum DOUBLE PRECISION,
+    rain_sum DOUBLE PRECISION,
+    snowfall_sum DOUBLE PRECISION,
+    pressure_msl_max DOUBLE PRECISION,
+    pressure_msl_min DOUBLE PRECISION,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (cell_lat, cell_lon, obs_date)
+);
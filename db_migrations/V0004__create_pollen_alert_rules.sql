@@ -0,0 +1,21 @@
+-- Правила оповещений о пыльце и частицах: проверяются на сервере по ячейкам сетки, а не в браузере
+CREATE TABLE IF NOT EXISTS pollen_alert_rules (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    location_lat DECIMAL(10, 8) NOT NULL,
+    location_lon DECIMAL(11, 8) NOT NULL,
+    -- alder, birch, grass, mugwort, olive, ragweed, pm25, pm10
+    allergen VARCHAR(16) NOT NULL,
+    -- Порог в единицах ряда; если не задан, берётся нижняя граница класса min_risk (medium, high, very_high)
+    threshold DOUBLE PRECISION,
+    min_risk VARCHAR(16),
+    email VARCHAR(255),
+    telegram VARCHAR(255),
+    enabled BOOLEAN DEFAULT TRUE,
+    last_notified_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CHECK (threshold IS NOT NULL OR min_risk IS NOT NULL)
+);
+
+CREATE INDEX IF NOT EXISTS idx_pollen_alert_rules_enabled ON pollen_alert_rules(enabled) WHERE enabled;
+CREATE INDEX IF NOT EXISTS idx_pollen_alert_rules_user_id ON pollen_alert_rules(user_id);
@@ -0,0 +1,6 @@
+-- История планетарного индекса Kp (3-часовые интервалы NOAA): хранится 30 дней, чтобы отдавать историю без запросов к NOAA
+CREATE TABLE IF NOT EXISTS kp_history (
+    time_tag TIMESTAMP PRIMARY KEY,
+    kp DOUBLE PRECISION NOT NULL,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
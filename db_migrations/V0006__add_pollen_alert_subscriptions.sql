@@ -0,0 +1,4 @@
+-- Подписка, которой принадлежат правила: случайный идентификатор из браузера, сохранение настроек заменяет все её правила
+ALTER TABLE pollen_alert_rules ADD COLUMN IF NOT EXISTS subscription_id VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_pollen_alert_rules_subscription_id ON pollen_alert_rules(subscription_id);
@@ -7,6 +7,7 @@ import NotificationChannels from './NotificationChannels';
 import PollenNotifications from './PollenNotifications';
 import WeatherNotifications from './WeatherNotifications';
 import GeomagneticNotifications from './GeomagneticNotifications';
+import { notificationService } from '@/services/notificationService';
 
 const NOTIFICATIONS_API = 'https://functions.poehali.dev/69d98fba-a11e-4a25-bab8-02070f305ce1';
 const TELEGRAM_BOT_API = 'https://functions.poehali.dev/f03fce2f-ec26-44b9-8491-2ec4d99f6a01';
@@ -142,6 +143,7 @@ export default function NotificationSettings() {
     }
 
     localStorage.setItem('weatherNotifications', JSON.stringify(settings));
+    notificationService.syncPollenAlerts();
     
     toast({
       title: '✅ Настройки сохранены',
@@ -179,8 +179,8 @@ const Index = () => {
       const data = await response.json();
       setWeatherData(data);
       
-      if (data && airQualityData) {
-        notificationService.checkAllConditions(data, airQualityData);
+      if (data) {
+        notificationService.checkAllConditions(data);
       }
     } catch (error) {
       console.error('Failed to fetch weather:', error);
@@ -194,10 +194,7 @@ const Index = () => {
       const response = await fetch(`${AIR_QUALITY_API_URL}?lat=${lat}&lon=${lon}`);
       const data = await response.json();
       setAirQualityData(data);
-      
-      if (data && weatherData) {
-        notificationService.checkAllConditions(weatherData, data);
-      }
+      notificationService.syncPollenAlerts(lat, lon);
     } catch (error) {
       console.error('Failed to fetch air quality:', error);
     }
@@ -256,7 +253,7 @@ const Index = () => {
           
           if (data.results && data.results.length > 0) {
             const location = data.results[0];
-            setSelectedLocation(location);
+            setSelectedLocation({ ...location, lat, lon });
           } else {
             setSelectedLocation({
               name: 'Моё местоположение',
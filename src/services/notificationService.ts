@@ -30,22 +30,30 @@ interface WeatherData {
   pressure?: number;
 }
 
-interface AirQualityData {
-  pollen?: {
-    birch_pollen?: number;
-    grass_pollen?: number;
-    ragweed_pollen?: number;
-    tree_pollen?: number;
-    weed_pollen?: number;
-  };
+interface PollenAlertRule {
+  allergen: string;
+  min_risk: 'medium' | 'high';
 }
 
 const NOTIFICATIONS_API = 'https://functions.poehali.dev/69d98fba-a11e-4a25-bab8-02070f305ce1';
+const AIR_QUALITY_API = 'https://functions.poehali.dev/fe7bc55e-5d6e-4c25-a2bf-2fd682293e6a';
+const SUBSCRIPTION_KEY = 'pollenAlertSubscription';
+
+// Pollen types of the settings screen mapped to the air-quality forecast series
+const POLLEN_TYPE_SERIES: { [key: string]: string[] } = {
+  birch: ['birch'],
+  grass: ['grass'],
+  ragweed: ['ragweed'],
+  tree: ['alder', 'olive'],
+  weed: ['mugwort']
+};
 
 export class NotificationService {
   private settings: NotificationSettings | null = null;
   private lastNotificationTime: { [key: string]: number } = {};
   private readonly NOTIFICATION_COOLDOWN = 3600000;
+  private location: { lat: number; lon: number } | null = null;
+  private syncedAlerts = '';
 
   constructor() {
     this.loadSettings();
@@ -99,36 +107,56 @@ export class NotificationService {
     }
   }
 
-  async checkPollenLevels(airQualityData: AirQualityData): Promise<void> {
-    if (!this.settings) return;
-    if (!this.settings.pollenHigh && !this.settings.pollenMedium) return;
+  private getSubscriptionId(): string {
+    let id = localStorage.getItem(SUBSCRIPTION_KEY);
+    if (!id) {
+      id = crypto.randomUUID();
+      localStorage.setItem(SUBSCRIPTION_KEY, id);
+    }
+    return id;
+  }
 
-    const pollen = airQualityData.pollen;
-    if (!pollen) return;
+  private buildPollenRules(): PollenAlertRule[] {
+    if (!this.settings) return [];
+    if (!this.settings.pollenHigh && !this.settings.pollenMedium) return [];
+    if (!this.settings.emailEnabled && !this.settings.telegramEnabled) return [];
 
-    const pollenTypes = [
-      { id: 'birch', value: pollen.birch_pollen || 0, label: 'Берёза' },
-      { id: 'grass', value: pollen.grass_pollen || 0, label: 'Злаковые травы' },
-      { id: 'ragweed', value: pollen.ragweed_pollen || 0, label: 'Амброзия' },
-      { id: 'tree', value: pollen.tree_pollen || 0, label: 'Деревья' },
-      { id: 'weed', value: pollen.weed_pollen || 0, label: 'Сорные травы' }
-    ];
+    const minRisk: PollenAlertRule['min_risk'] = this.settings.pollenMedium ? 'medium' : 'high';
+    return Object.entries(POLLEN_TYPE_SERIES)
+      .filter(([type]) => this.settings!.pollenTypes[type as keyof NotificationSettings['pollenTypes']])
+      .flatMap(([, series]) => series.map(allergen => ({ allergen, min_risk: minRisk })));
+  }
 
-    for (const pollenType of pollenTypes) {
-      const isEnabled = this.settings.pollenTypes[pollenType.id as keyof typeof this.settings.pollenTypes];
-      if (!isEnabled) continue;
+  // Pollen levels are checked on the server against the saved rules, so alerts arrive with the page closed
+  async syncPollenAlerts(lat?: number, lon?: number): Promise<void> {
+    if (lat !== undefined && lon !== undefined) {
+      this.location = { lat, lon };
+    }
+    this.loadSettings();
+    if (!this.settings || !this.location) return;
+
+    const body = JSON.stringify({
+      subscription_id: this.getSubscriptionId(),
+      lat: this.location.lat,
+      lon: this.location.lon,
+      email: this.settings.emailEnabled ? this.settings.email : '',
+      telegram: this.settings.telegramEnabled ? this.settings.telegram : '',
+      rules: this.buildPollenRules()
+    });
+    if (body === this.syncedAlerts) return;
 
-      if (this.settings.pollenHigh && pollenType.value > 9.0) {
-        await this.sendNotification(
-          `⚠️ ВЫСОКИЙ уровень пыльцы!\n\n${pollenType.label}: ${pollenType.value.toFixed(1)}\n\nРекомендуется оставаться в помещении и принять антигистаминные препараты.`,
-          'pollen_high'
-        );
-      } else if (this.settings.pollenMedium && pollenType.value >= 4.0 && pollenType.value <= 9.0) {
-        await this.sendNotification(
-          `⚡ Средний уровень пыльцы\n\n${pollenType.label}: ${pollenType.value.toFixed(1)}\n\nБудьте внимательны при выходе на улицу.`,
-          'pollen_medium'
-        );
+    try {
+      const response = await fetch(`${AIR_QUALITY_API}?action=alert-rules`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body
+      });
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
       }
+      this.syncedAlerts = body;
+    } catch (error) {
+      console.error('Failed to save pollen alerts:', error);
     }
   }
 
@@ -175,9 +203,8 @@ export class NotificationService {
     }
   }
 
-  async checkAllConditions(weatherData: WeatherData, airQualityData: AirQualityData): Promise<void> {
+  async checkAllConditions(weatherData: WeatherData): Promise<void> {
     await this.checkWeatherConditions(weatherData);
-    await this.checkPollenLevels(airQualityData);
   }
 
   async sendDailyForecast(forecastText: string): Promise<void> {